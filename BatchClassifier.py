@@ -0,0 +1,267 @@
+"""Offline batch classification of the laptop inventory.
+
+Runs product_map_layer and get_chat_completions_func_calling over every laptop the rule
+classifier cannot fully classify, with a bounded thread pool and token-bucket rate
+limiting. Progress is checkpointed to a JSON-lines file so an interrupted run resumes
+where it stopped, results are added to the persistent classification store, and an
+enriched inventory (feature level columns plus the classifier prompt version) is written
+for the app to load at startup (SHOPASSIST_INVENTORY=<output>).
+
+Stubbed runs (--stub) are kept apart from real ones: they use a temporary classification
+store and a memory-only response cache, write laptop_inventory_enriched.stub.csv by
+default, and tag their results with a "stub-" classifier version that the app ignores.
+
+Usage:
+    python BatchClassifier.py --input laptop_inventory.csv --output laptop_inventory_enriched.csv
+    python BatchClassifier.py --stub            # offline, against a stubbed completion client
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import HelperFunctions
+from LaptopCatalog import (
+    CLASSIFIER_VERSION_COLUMN,
+    FEATURE_COLUMNS,
+    LEVELS,
+    UNKNOWN_LEVEL,
+    classify_laptop_features,
+    read_inventory
+)
+from ResponseCache import ResponseCache
+
+# LLM calls made per classified laptop (product_map_layer + function calling)
+CALLS_PER_LAPTOP = 2
+# Prefix of the classifier version of results produced by StubCompletionClient
+STUB_VERSION_PREFIX = 'stub-'
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` acquisitions per second with bursts of `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """Block until `tokens` tokens are available and take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class StubCompletionClient:
+    """Offline stand-in for the OpenAI client used by HelperFunctions.
+
+    Classification requests get a deterministic answer derived from a hash of the laptop
+    description, and function calling requests extract the levels named in the input,
+    so the batch job can be exercised end to end without network access. latency and
+    failure_rate simulate a slow or unreliable upstream.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        content = params['messages'][-1]['content']
+        if self.failure_rate and (call_number * 2654435761 % 1000) / 1000 < self.failure_rate:
+            raise RuntimeError("Stubbed upstream failure")
+
+        if 'functions' in params:
+            levels = re.findall(r'\b(low|medium|high)\b', content.lower())
+            levels = (levels + ['medium'] * len(FEATURE_COLUMNS))[:len(FEATURE_COLUMNS)]
+            arguments = dict(zip(FEATURE_COLUMNS, levels), Budget=0)
+            message = types.SimpleNamespace(
+                content=None,
+                function_call=types.SimpleNamespace(name='extract_user_info', arguments=json.dumps(arguments))
+            )
+        else:
+            digest = hashlib.sha256(content.encode('utf-8')).digest()
+            levels = [LEVELS[byte % len(LEVELS)] for byte in digest[:len(FEATURE_COLUMNS)]]
+            message = types.SimpleNamespace(
+                content=(f"Laptop with {levels[0]} GPU intensity, {levels[1]} display quality, "
+                         f"{levels[2]} portability, {levels[3]} multitasking, {levels[4]} processing speed"),
+                function_call=None
+            )
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def load_checkpoint(path: str, classifier_version: str) -> dict:
+    """Return {cache key: classification} for the laptops completed by earlier runs
+    with the same classifier version."""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get('version') == classifier_version:
+                completed[record['key']] = record['values']
+    return completed
+
+
+def write_enriched_output(laptop_df, feature_levels, path: str, classifier_version: str):
+    """Write the inventory with one low/medium/high column per feature and the classifier version.
+
+    Parquet is written when the path ends in .parquet (requires pyarrow), CSV otherwise.
+    """
+    enriched = laptop_df.copy()
+    for key in FEATURE_COLUMNS:
+        enriched[key] = [LEVELS[level] if level != UNKNOWN_LEVEL else '' for level in feature_levels[key]]
+    enriched[CLASSIFIER_VERSION_COLUMN] = classifier_version
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if path.endswith('.parquet'):
+        enriched.to_parquet(tmp_path, index=False)
+    else:
+        enriched.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def classify_inventory(input_path: str, output_path: str, checkpoint_path: str = None, workers: int = 4,
+                       rate: float = 5.0, report_every: float = 10.0, classifier_version: str = None) -> dict:
+    """Classify an inventory file and write the enriched output.
+
+    Args:
+        input_path (str): Inventory CSV/Parquet file
+        output_path (str): Enriched output file (.csv or .parquet)
+        checkpoint_path (str): JSON-lines checkpoint (defaults to <output>.checkpoint.jsonl)
+        workers (int): Concurrent classifications
+        rate (float): Maximum LLM requests per second
+        report_every (float): Seconds between progress reports
+        classifier_version (str, optional): Version written to the checkpoint and the
+            output (default: the classifier prompt version; stubbed runs use their own)
+
+    Returns:
+        dict: Run statistics (rows, classified, resumed, failed, seconds, laptops_per_second)
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.jsonl"
+    classifier_version = classifier_version or HelperFunctions.get_classifier_prompt_version()
+    laptop_df = read_inventory(input_path)
+    descriptions = laptop_df['Description'].fillna('').astype(str)
+    feature_levels = classify_laptop_features(laptop_df)
+    needs_llm = (feature_levels == UNKNOWN_LEVEL).any(axis=1)
+
+    keys = {description: HelperFunctions.classification_cache_key(description)
+            for description in descriptions[needs_llm].unique()}
+    completed = load_checkpoint(checkpoint_path, classifier_version)
+    pending = [description for description, key in keys.items() if key not in completed]
+    stats = {'rows': len(laptop_df), 'llm_rows': int(needs_llm.sum()), 'unique_descriptions': len(keys),
+             'resumed': len(keys) - len(pending), 'classified': 0, 'failed': 0}
+    print(f"{stats['rows']} laptops, {stats['unique_descriptions']} to classify with the LLM, "
+          f"{stats['resumed']} already in the checkpoint")
+
+    bucket = TokenBucket(rate, capacity=max(rate, CALLS_PER_LAPTOP))
+    started = time.monotonic()
+    last_report = started
+
+    def classify(description):
+        bucket.acquire(CALLS_PER_LAPTOP)
+        return HelperFunctions.classify_laptop_description(description)
+
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(classify, description): description for description in pending}
+        for future in as_completed(futures):
+            description = futures[future]
+            try:
+                laptop_values = future.result()
+            except Exception as e:
+                laptop_values = {'error': str(e)}
+            if 'error' in laptop_values:
+                stats['failed'] += 1
+            else:
+                stats['classified'] += 1
+                completed[keys[description]] = laptop_values
+                checkpoint.write(json.dumps({'key': keys[description], 'version': classifier_version,
+                                             'values': laptop_values}) + '\n')
+                checkpoint.flush()
+
+            now = time.monotonic()
+            if now - last_report >= report_every:
+                last_report = now
+                done = stats['classified'] + stats['failed']
+                print(f"{done}/{len(pending)} classified ({done / (now - started):.1f}/s), {stats['failed']} failed")
+
+    # Fill the attributes the rules could not parse, as the app does at startup
+    for index in laptop_df.index[needs_llm]:
+        laptop_values = completed.get(keys[descriptions[index]])
+        if laptop_values is None:
+            continue
+        for position, key in enumerate(FEATURE_COLUMNS):
+            if feature_levels.at[index, key] == UNKNOWN_LEVEL:
+                level = str(laptop_values.get(key, '')).lower()
+                feature_levels.at[index, key] = LEVELS.index(level) if level in LEVELS else UNKNOWN_LEVEL
+
+    # Share the results with the app's persistent classification store
+    store = HelperFunctions.load_classification_cache()
+    store.update(completed)
+    HelperFunctions.save_classification_cache()
+    write_enriched_output(laptop_df, feature_levels, output_path, classifier_version)
+
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    stats['laptops_per_second'] = round((stats['classified'] + stats['failed']) / stats['seconds'], 2) if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-classify the laptop inventory with the LLM classifier.")
+    parser.add_argument('--input', default='laptop_inventory.csv', help="Inventory CSV or Parquet file")
+    parser.add_argument('--output', help="Enriched output (.csv or .parquet; default: laptop_inventory_enriched.csv, "
+                                         "or laptop_inventory_enriched.stub.csv with --stub)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent classifications")
+    parser.add_argument('--rate', type=float, default=5.0, help="Maximum LLM requests per second")
+    parser.add_argument('--stub', action='store_true', help="Use an offline stubbed completion client")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="Seconds of latency per stubbed call")
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0, help="Fraction of stubbed calls that fail")
+    args = parser.parse_args()
+
+    # Without --stub the shared client reads the key from OPENAI_API_KEY or OpenAI_API_Key.txt
+    if not args.stub:
+        stats = classify_inventory(args.input, args.output or 'laptop_inventory_enriched.csv', args.checkpoint,
+                                   args.workers, args.rate)
+        print(json.dumps(stats, indent=2))
+        return
+
+    # Stubbed levels must never reach the app's classification store or response cache
+    HelperFunctions.set_completion_client(StubCompletionClient(args.stub_latency, args.stub_failure_rate))
+    HelperFunctions.llm_response_cache = ResponseCache()
+    with tempfile.TemporaryDirectory() as store_dir:
+        HelperFunctions.use_classification_cache(os.path.join(store_dir, 'classification_cache.json'))
+        stats = classify_inventory(args.input, args.output or 'laptop_inventory_enriched.stub.csv', args.checkpoint,
+                                   args.workers, args.rate,
+                                   classifier_version=STUB_VERSION_PREFIX + HelperFunctions.get_classifier_prompt_version())
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
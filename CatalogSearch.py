@@ -0,0 +1,434 @@
+"""Local search over the laptop catalog and a router for factual follow-up questions.
+
+CatalogSearch indexes a set of laptops: typed numeric columns (weight, battery life,
+price, RAM, screen size, clock speed, warranty), an inverted index of the tokens of the
+spec columns, and a BM25 index over the Descriptions. route_follow_up uses it to answer
+attribute lookups, superlatives ("which is lightest"), comparisons and feature questions
+("which ones have a backlit keyboard") about the recommended laptops or the whole
+catalog, and returns None for anything open-ended so the LLM answers instead.
+"""
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+
+# Numeric attributes: inventory column, label used in answers, and the words for their
+# smallest and largest values
+NUMERIC_ATTRIBUTES = {
+    'weight': ('Laptop Weight', 'weight', 'lightest', 'heaviest'),
+    'battery': ('Average Battery Life', 'battery life', 'shortest battery life', 'longest battery life'),
+    'price': ('Price', 'price', 'cheapest', 'most expensive'),
+    'ram': ('RAM Size', 'RAM', 'least RAM', 'most RAM'),
+    'screen': ('Display Size', 'screen size', 'smallest screen', 'largest screen'),
+    'clock': ('Clock Speed', 'clock speed', 'lowest clock speed', 'highest clock speed'),
+    'warranty': ('Warranty', 'warranty', 'shortest warranty', 'longest warranty')
+}
+
+# Descriptive attributes answered with the raw column values
+TEXT_ATTRIBUTES = {
+    'processor': (['Core', 'CPU Manufacturer', 'Clock Speed'], 'processor'),
+    'graphics': (['Graphics Processor'], 'graphics'),
+    'storage': (['Storage Type'], 'storage'),
+    'os': (['OS'], 'operating system'),
+    'resolution': (['Screen Resolution'], 'screen resolution'),
+    'display_type': (['Display Type'], 'display type'),
+    'features': (['Special Features'], 'special features')
+}
+
+# Spec columns whose tokens are indexed for feature questions
+KEYWORD_COLUMNS = ['Brand', 'Model Name', 'Core', 'CPU Manufacturer', 'Storage Type', 'Display Type',
+                   'Graphics Processor', 'OS', 'Special Features']
+
+# Question words -> attribute; checked in order, the first match wins
+ATTRIBUTE_PATTERNS = [
+    ('weight', re.compile(r'\b(weigh|weighs|weight|heavy|heavier|heaviest|light|lighter|lightest|portable)\b')),
+    ('battery', re.compile(r'\b(battery|batteries|unplugged)\b')),
+    ('ram', re.compile(r'\b(ram|memory)\b')),
+    ('warranty', re.compile(r'\b(warranty|guarantee)\b')),
+    ('screen', re.compile(r'\b(screen|display) size\b|\b(biggest|largest|smallest|bigger|smaller|inch|inches)\b')),
+    ('clock', re.compile(r'\b(clock|ghz|fastest|slowest|faster|slower)\b')),
+    ('price', re.compile(r'\b(price|prices|priced|cost|costs|expensive|cheap|cheaper|cheapest|affordable|pricey|priciest)\b')),
+    ('processor', re.compile(r'\b(processor|cpu|chip|core)\b')),
+    ('graphics', re.compile(r'\b(gpu|graphics)\b')),
+    ('storage', re.compile(r'\b(storage|ssd|hdd|disk)\b')),
+    ('os', re.compile(r'\b(os|operating system)\b')),
+    ('resolution', re.compile(r'\bresolution\b')),
+    ('display_type', re.compile(r'\b(display|panel) type\b')),
+    ('features', re.compile(r'\b(special )?features\b'))
+]
+
+# Words for the smallest and largest value; comparatives count only in "which ..." questions
+# ("is there a cheaper one?" asks for other laptops, not the cheapest of these)
+MIN_PATTERN = re.compile(r'\b(lightest|least|lowest|smallest|shortest|worst|cheapest|most affordable|minimum|slowest)\b')
+MAX_PATTERN = re.compile(r'\b(heaviest|most|highest|largest|biggest|longest|best|maximum|fastest|priciest|costliest|'
+                         r'greatest)\b')
+# Superlatives and comparatives that name an attribute of their own; in a question about
+# another attribute they pick the laptop ("the battery of the cheapest one"), which is left
+# to the LLM
+ATTRIBUTE_WORD_PATTERNS = {
+    'weight': re.compile(r'\b(lightest|heaviest|lighter|heavier)\b'),
+    'price': re.compile(r'\b(cheapest|cheaper|priciest|pricier|costliest|expensive|affordable)\b'),
+    'clock': re.compile(r'\b(fastest|slowest|faster|slower)\b')
+}
+MIN_COMPARATIVE_PATTERN = re.compile(r'\b(lighter|smaller|shorter|cheaper|more affordable|slower|less)\b')
+MAX_COMPARATIVE_PATTERN = re.compile(r'\b(heavier|bigger|larger|longer|faster|pricier|more|higher)\b')
+LOOKUP_PATTERN = re.compile(r'^\s*(what|which|how|list|show|compare|tell me|give me|does|do|is there|are there)\b')
+LISTING_PATTERN = re.compile(r'\b(each|all|every|them|these|those|compare|comparison|list)\b')
+FEATURE_PATTERN = re.compile(r'\b(?:have|has|having|with|support|supports|come with|comes with|include|includes|'
+                             r'offer|offers)\b(?:\s+(?:a|an|the|any))?\s+(.+?)[?.!]*$')
+CATALOG_SCOPE_PATTERN = re.compile(r'\b(catalog|catalogue|inventory|store|shop|in stock|overall|all (the )?laptops|'
+                                   r'any laptop|you (have|sell|carry|offer))\b')
+# Questions asking for judgement rather than facts go to the LLM
+SUBJECTIVE_PATTERN = re.compile(r'\b(best|better|good|great|nice|decent|worth|recommend|should|suitable|enough|'
+                                r'prefer|ideal)\b')
+# Bounds on a value ("under 60000", "below 1.5 kg", "within rs 80k") in a superlative question
+BOUND_PATTERN = re.compile(r'\b(under|below|over|above|within|between|less than|more than|at least|at most|up to|'
+                           r'upto|no more than)\s+(rs\.?\s*|inr\s*|₹\s*)?\d|'
+                           r'\d\s*(kg|kgs|g|lbs?|k|rs|inr|rupees|gb|tb|hours?|hrs?|inch|inches|ghz)\b|(\brs\.?|\binr|₹)\s*\d')
+# Words a superlative question may contain besides the attribute it ranks by; any other
+# word (a feature, brand or model) is a condition the local answer would ignore
+SUPERLATIVE_WORDS = {'what', 'which', 'who', 'how', 'is', 'are', 'has', 'have', 'with', 'there', 'among', 'out',
+                     'all', 'much', 'show', 'list', 'tell', 'give', 'find', 'life', 'size', 'screen', 'display',
+                     'speed', 'budget', 'friendly', 'option', 'model', 'models', 'stock', 'sell', 'carry', 'offer',
+                     'available', 'right', 'now'}
+ORDINALS = {'first': 0, '1st': 0, 'second': 1, '2nd': 1, 'third': 2, '3rd': 2}
+ORDINAL_PATTERN = re.compile(r'\b(first|1st|second|2nd|third|3rd)\b|\b(?:laptop|option|number|no\.?|#)\s*([1-3])\b')
+STOPWORDS = {'a', 'an', 'the', 'any', 'of', 'them', 'these', 'those', 'laptop', 'laptops', 'one', 'ones', 'which',
+             'do', 'does', 'it', 'that', 'this', 'and', 'or', 'to', 'for', 'in', 'on', 'is', 'are', 'you', 'your',
+             'me', 'my', 'i', 'please', 'also', 'both', 'recommended', 'options'}
+# Spelling variants mapped to the tokens used in the inventory
+SYNONYMS = {'touch screen': 'touchscreen', 'touch-screen': 'touchscreen', 'finger print': 'fingerprint',
+            'face id': 'face unlock', 'mac os': 'macos', 'back lit': 'backlit', 'back-lit': 'backlit'}
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def _parse_numbers(values) -> np.ndarray:
+    import pandas as pd
+
+    numbers = pd.Series(values).astype(str).str.replace(',', '', regex=False).str.extract(r'(\d+(?:\.\d+)?)')[0]
+    return pd.to_numeric(numbers, errors='coerce').to_numpy(dtype=float)
+
+
+class BM25Index:
+    """Okapi BM25 over a list of documents, with postings held as term -> {doc: term frequency}."""
+
+    def __init__(self, documents, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        lengths = []
+        for doc, text in enumerate(documents):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self.postings[term][doc] = frequency
+        import numpy as np
+
+        self.doc_lengths = np.asarray(lengths, dtype=float)
+        self.average_length = float(self.doc_lengths.mean()) if lengths else 0.0
+
+    def search(self, terms: list, candidates=None, require_all: bool = True) -> list:
+        """Return [(doc, score)] by decreasing score for the documents matching terms.
+
+        Args:
+            terms (list): Query tokens
+            candidates (iterable, optional): Restrict the search to these documents
+            require_all (bool): Only return documents that contain every term
+        """
+        terms = [term for term in dict.fromkeys(terms) if term]
+        if not terms:
+            return []
+        postings = [self.postings.get(term, {}) for term in terms]
+        docs = set(postings[0]) if require_all else set().union(*postings)
+        for posting in postings[1:] if require_all else []:
+            docs &= set(posting)
+        if candidates is not None:
+            docs &= set(candidates)
+
+        total = len(self.doc_lengths)
+        scores = []
+        for doc in docs:
+            score = 0.0
+            length_norm = 1 - self.b + self.b * self.doc_lengths[doc] / (self.average_length or 1)
+            for posting in postings:
+                frequency = posting.get(doc)
+                if frequency:
+                    idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                    score += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            scores.append((doc, score))
+        return sorted(scores, key=lambda item: (-item[1], item[0]))
+
+
+class CatalogSearch:
+    """Search index over a set of laptops (the recommended ones or the whole catalog).
+
+    Args:
+        laptop_df (pd.DataFrame): Inventory rows, with at least Brand, Model Name, Price
+                                  and Description; missing spec columns are treated as empty
+    """
+
+    def __init__(self, laptop_df: pd.DataFrame):
+        self.laptop_df = laptop_df.reset_index(drop=True)
+        self.names = (self._column('Brand').astype(str) + ' ' + self._column('Model Name').astype(str)).str.strip().tolist()
+        self.numeric = {attribute: _parse_numbers(self._column(column))
+                        for attribute, (column, _, _, _) in NUMERIC_ATTRIBUTES.items()}
+
+        # Inverted index of spec column tokens, built per distinct value
+        self.keyword_index = defaultdict(set)
+        for column in KEYWORD_COLUMNS:
+            values = self._column(column).astype(str)
+            for value, rows in values.groupby(values).groups.items():
+                for term in tokenize(value):
+                    self.keyword_index[term].update(int(row) for row in rows)
+        self._bm25 = None
+        self._bm25_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.laptop_df)
+
+    def _column(self, column: str) -> pd.Series:
+        import pandas as pd
+
+        if column in self.laptop_df.columns:
+            return self.laptop_df[column].fillna('')
+        return pd.Series([''] * len(self.laptop_df))
+
+    @property
+    def bm25(self) -> BM25Index:
+        # Built on first use: tokenizing every Description is the most expensive part
+        with self._bm25_lock:
+            if self._bm25 is None:
+                documents = (self._column('Description').astype(str) + ' ' +
+                             self._column('Special Features').astype(str)).tolist()
+                self._bm25 = BM25Index(documents)
+            return self._bm25
+
+    def value(self, row: int, columns) -> str:
+        if isinstance(columns, str):
+            columns = [columns]
+        if columns == ['Price']:
+            return f"Rs {int(self.numeric['price'][row]):,}"
+        return ' '.join(str(self.laptop_df.at[row, column]) for column in columns
+                        if column in self.laptop_df.columns and str(self.laptop_df.at[row, column]))
+
+    def extreme(self, attribute: str, largest: bool, rows=None) -> list:
+        """Return the rows (of rows, default all) with the smallest or largest value of attribute."""
+        import numpy as np
+
+        rows = np.arange(len(self)) if rows is None else np.asarray(list(rows))
+        values = self.numeric[attribute][rows]
+        if rows.size == 0 or np.all(np.isnan(values)):
+            return []
+        best = np.nanmax(values) if largest else np.nanmin(values)
+        return rows[values == best].tolist()
+
+    def match_features(self, terms: list, rows=None) -> list:
+        """Return the rows whose spec columns, or else Descriptions, contain every term."""
+        candidates = set(range(len(self))) if rows is None else set(rows)
+        matched = set(candidates)
+        for term in terms:
+            matched &= self.keyword_index.get(term, set())
+        if matched:
+            return sorted(matched, key=lambda row: -self.numeric['price'][row])
+        return [doc for doc, _ in self.bm25.search(terms, candidates=candidates)]
+
+    def find_named(self, question: str, rows=None) -> list:
+        """Return the rows whose model (or, if unambiguous, brand) is named in the question."""
+        rows = range(len(self)) if rows is None else rows
+        text = ' '.join(tokenize(question))
+        named = [row for row in rows
+                 if ' '.join(tokenize(self.laptop_df.at[row, 'Model Name'])) and
+                 re.search(r'\b' + re.escape(' '.join(tokenize(self.laptop_df.at[row, 'Model Name']))) + r'\b', text)]
+        if named:
+            return named
+        by_brand = [row for row in rows if re.search(r'\b' + re.escape(' '.join(tokenize(self._column('Brand')[row]))) + r'\b', text)]
+        return by_brand if len(by_brand) == 1 else []
+
+
+def _join_names(names: list) -> str:
+    return names[0] if len(names) == 1 else ', '.join(names[:-1]) + ' and ' + names[-1]
+
+
+def _detect_attribute(question: str):
+    for attribute, pattern in ATTRIBUTE_PATTERNS:
+        if pattern.search(question):
+            return attribute
+    return None
+
+
+def _feature_terms(question: str) -> list:
+    match = FEATURE_PATTERN.search(question)
+    if not match:
+        return []
+    phrase = match.group(1)
+    for variant, canonical in SYNONYMS.items():
+        phrase = phrase.replace(variant, canonical)
+    return [term for term in tokenize(phrase) if term not in STOPWORDS]
+
+
+def _ranks_with_conditions(question: str, attribute: str, search: CatalogSearch, named: list) -> bool:
+    """Whether a superlative question also filters or ranks by something other than attribute.
+
+    "the lightest laptop with an rtx gpu", "the cheapest one under 60000", "the lightest
+    macbook" or "the lowest weight and the best battery" would otherwise be answered with
+    the extreme of attribute over every laptop.
+    """
+    if BOUND_PATTERN.search(question):
+        return True
+    rest = question
+    for pattern in (ORDINAL_PATTERN, CATALOG_SCOPE_PATTERN, MIN_PATTERN, MAX_PATTERN,
+                    MIN_COMPARATIVE_PATTERN, MAX_COMPARATIVE_PATTERN):
+        rest = pattern.sub(' ', rest)
+    if any(pattern.search(rest) for other, pattern in ATTRIBUTE_PATTERNS if other != attribute):
+        return True
+    rest = dict(ATTRIBUTE_PATTERNS)[attribute].sub(' ', rest)
+    named_tokens = {token for row in named for token in tokenize(search.names[row])}
+    return any(token not in STOPWORDS and token not in SUPERLATIVE_WORDS and token not in named_tokens
+               for token in tokenize(rest))
+
+
+def route_follow_up(question: str, products: list, catalog_search=None):
+    """Answer a factual follow-up question from the catalog, or return None.
+
+    Args:
+        question (str): The user's message
+        products (list): Recommended laptops (inventory records), as shown to the user
+        catalog_search (callable, optional): Returns the CatalogSearch of the whole catalog;
+                                             used for questions about the catalog
+
+    Returns:
+        str or None: The answer, or None when the question needs the LLM
+    """
+    question = ' '.join(str(question).lower().split())
+    if not products or not LOOKUP_PATTERN.search(question):
+        return None
+
+    catalog_scope = bool(CATALOG_SCOPE_PATTERN.search(question)) and catalog_search is not None
+    if catalog_scope:
+        search = catalog_search()
+        scope = "In our catalog"
+    else:
+        # The recommendations are listed in decreasing order of price
+        products = sorted(products, key=lambda product: -float(str(product.get('Price', 0)).replace(',', '') or 0))
+        import pandas as pd
+
+        search = CatalogSearch(pd.DataFrame(products))
+        scope = "Of the laptops I recommended"
+    rows = list(range(len(search)))
+    attribute = _detect_attribute(question)
+
+    if any(pattern.search(question) for word_attribute, pattern in ATTRIBUTE_WORD_PATTERNS.items()
+           if word_attribute != attribute):
+        return None
+
+    # Specific laptops, by name or position in the list ("the first or the third")
+    named = []
+    if not catalog_scope:
+        positions = [ORDINALS[match.group(1)] if match.group(1) else int(match.group(2)) - 1
+                     for match in ORDINAL_PATTERN.finditer(question)]
+        named = list(dict.fromkeys(search.find_named(question) +
+                                   [position for position in positions if position < len(search)]))
+
+    if attribute in NUMERIC_ATTRIBUTES:
+        column, label, smallest, largest = NUMERIC_ATTRIBUTES[attribute]
+        comparative = question.startswith('which')
+        # Price words are checked first: the "most affordable" or "best priced" is the cheapest
+        if attribute == 'price' and re.search(r'\b(affordable|best|budget)\b', question):
+            direction = False
+        elif MIN_PATTERN.search(question) or (comparative and MIN_COMPARATIVE_PATTERN.search(question)):
+            direction = False
+        elif MAX_PATTERN.search(question) or (comparative and MAX_COMPARATIVE_PATTERN.search(question)):
+            direction = True
+        else:
+            direction = None
+
+        if named and direction is None:
+            return ' '.join(f"The {search.names[row]} has a {label} of {search.value(row, column)}." for row in named)
+        if direction is not None:
+            # Comparing a single laptop with itself would answer a different question
+            if len(named) == 1 or _ranks_with_conditions(question, attribute, search, named):
+                return None
+            compared = named or rows
+            best = search.extreme(attribute, direction, compared)
+            if not best:
+                return None
+            if len(compared) > 1 and len(best) == len(compared):
+                together = 'both' if len(compared) == 2 else f"all {len(compared)}"
+                return f"{scope}, {together} have the same {label}: {search.value(best[0], column)}."
+            extreme = largest if direction else smallest
+            if len(best) == 1:
+                answer = f"{scope}, the {extreme} is the {search.names[best[0]]} ({search.value(best[0], column)})."
+            else:
+                names = _join_names([search.names[row] for row in best[:5]])
+                answer = f"{scope}, the {names} tie for the {extreme} ({search.value(best[0], column)})."
+            if not catalog_scope and len(rows) > 1:
+                answer += " For comparison: " + ', '.join(
+                    f"{search.names[row]} {search.value(row, column)}" for row in rows) + "."
+            return answer
+        if not catalog_scope and LISTING_PATTERN.search(question):
+            return f"{label[0].upper() + label[1:]}: " + ', '.join(
+                f"{search.names[row]} {search.value(row, column)}" for row in rows) + "."
+        return None
+
+    terms = _feature_terms(question)
+    if attribute in TEXT_ATTRIBUTES and not terms:
+        columns, label = TEXT_ATTRIBUTES[attribute]
+        if named:
+            return ' '.join(f"The {search.names[row]} has {label}: {search.value(row, columns)}." for row in named)
+        if not catalog_scope and LISTING_PATTERN.search(question):
+            return f"{label[0].upper() + label[1:]}: " + ', '.join(
+                f"{search.names[row]} {search.value(row, columns)}" for row in rows) + "."
+        return None
+
+    # Feature questions: "which ones have a backlit keyboard?", "does the first one have an ssd?"
+    if terms and not SUBJECTIVE_PATTERN.search(question) and \
+            re.search(r'^\s*(which|what|does|do|is there|are there|list|show)\b', question):
+        matches = search.match_features(terms, named or rows)
+        feature = ' '.join(terms)
+        # A feature missing from the spec columns and descriptions may just be unlisted,
+        # so only matches are answered locally
+        if not matches:
+            return None
+        if named and re.search(r'^\s*(does|do)\b', question):
+            if len(matches) < len(named):
+                return None
+            names = _join_names([search.names[row] for row in named])
+            return f"Yes, the {names} {'has' if len(named) == 1 else 'have'} {feature}."
+        names = _join_names([search.names[row] for row in matches[:5]])
+        more = f" (and {len(matches) - 5} more)" if len(matches) > 5 else ''
+        verb = 'has' if len(matches) == 1 else 'have'
+        return f"{scope}, the {names}{more} {verb} {feature}."
+    return None
+
+
+_catalog_search_cache = (None, None)
+_catalog_search_lock = threading.Lock()
+
+
+def catalog_search_for(snapshot) -> CatalogSearch:
+    """Return the CatalogSearch of a CatalogSnapshot, built once per snapshot."""
+    global _catalog_search_cache
+    cached_snapshot, search = _catalog_search_cache
+    if cached_snapshot is snapshot:
+        return search
+    with _catalog_search_lock:
+        cached_snapshot, search = _catalog_search_cache
+        if cached_snapshot is not snapshot:
+            laptop_df = snapshot.details.astype(object)
+            laptop_df['Price'] = snapshot.prices
+            laptop_df['Description'] = snapshot.descriptions
+            search = CatalogSearch(laptop_df)
+            _catalog_search_cache = (snapshot, search)
+        return search
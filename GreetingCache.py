@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import time
+
+
+class GreetingCache:
+    """Greeting shown at the start of every conversation, served without an API call.
+
+    get() returns the last generated greeting (persisted to path so that restarted or
+    new workers start with it), or default until one has been generated. A background
+    thread regenerates it every refresh_seconds; a greeting on disk younger than that is
+    reused at startup instead of being regenerated. Failed generations keep the current
+    greeting.
+    """
+
+    def __init__(self, generate, path: str = None, refresh_seconds: float = 6 * 3600, default: str = ''):
+        """
+        Args:
+            generate (callable): Returns a new greeting; raises on failure
+            path (str, optional): JSON file the greeting is persisted to
+            refresh_seconds (float): Interval between regenerations (0 disables them)
+            default (str): Greeting served until one has been generated
+        """
+        self.generate = generate
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._greeting = default
+        self._generated_at = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self) -> str:
+        return self._greeting
+
+    def start(self):
+        """Start the background refresh thread (once per process)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name='greeting-refresh', daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> bool:
+        """Generate a new greeting now; returns whether it succeeded."""
+        try:
+            greeting = self.generate()
+        except Exception as e:
+            print(f"Greeting generation failed: {str(e)}")
+            return False
+        if not greeting:
+            return False
+        self._greeting = greeting
+        self._generated_at = time.time()
+        self._save()
+        return True
+
+    def _refresh_loop(self):
+        if not self.refresh_seconds:
+            if not self._generated_at:
+                self.refresh()
+            return
+        while True:
+            if time.time() - self._generated_at >= self.refresh_seconds and not self.refresh():
+                time.sleep(60.0)  # Retry a failed generation a minute later
+                continue
+            time.sleep(max(1.0, self.refresh_seconds - (time.time() - self._generated_at)))
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._greeting = data['greeting']
+            self._generated_at = float(data['generated_at'])
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Ignoring unreadable greeting cache {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'greeting': self._greeting, 'generated_at': self._generated_at}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save the greeting cache: {str(e)}")
@@ -1,6 +1,42 @@
-import openai
-import pandas as pd
+from __future__ import annotations
+
 import json
+import functools
+import hashlib
+import os
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from CatalogSearch import catalog_search_for, route_follow_up
+from LaptopCatalog import (
+    FEATURE_COLUMNS,
+    LEVEL_MAPPING,
+    UNKNOWN_LEVEL,
+    CLASSIFIER_VERSION_COLUMN,
+    FAILED_CLASSIFICATIONS_ATTR,
+    LaptopCatalog,
+    classify_laptop_features,
+    encode_user_levels
+)
+from LLMClient import create_llm_client
+from Metrics import record_llm_call, registry, timed
+from ModerationService import ModerationService
+from ResponseCache import ResponseCache
+from SingleFlight import SingleFlight
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Call sites whose results are effectively pure functions of their prompt and are served
+# from llm_response_cache; the creative chat turns ("chat") are never cached
+CACHED_CALL_SITES = {'intent_confirmation', 'requirement_string', 'function_calling', 'product_map'}
+llm_response_cache = ResponseCache(
+    max_entries=int(os.environ.get('SHOPASSIST_LLM_CACHE_SIZE', 4096)),
+    ttl_seconds=float(os.environ.get('SHOPASSIST_LLM_CACHE_TTL', 24 * 3600)),
+    disk_path=os.environ.get('SHOPASSIST_LLM_CACHE_DB')
+)
+registry.gauges('shopassist_llm_response_cache', 'LLM response cache statistics', llm_response_cache.stats)
 
 # This function initiates create the system and role conversation with Open AI model
 def initialize_conversation():
@@ -44,31 +80,229 @@ def initialize_conversation():
     return [{"role": "system", "content": system_prompt.strip()}]
 
 
+# Shared OpenAI client (connection pooling, deadlines, retries, circuit breaker) used by
+# every call site; the batch classifier swaps in a stub client to run offline
+llm_client = create_llm_client()
+
+# Shown in place of an assistant reply when the OpenAI API cannot be reached
+LLM_UNAVAILABLE_MESSAGE = ("Sorry, I'm having trouble reaching my recommendation service right now. "
+                           "Please try again in a moment.")
+
+
+def set_completion_client(client):
+    llm_client.set_client(client)
+
+
+# Chat Completion API call shared by all helpers; results of the call sites in
+# CACHED_CALL_SITES are served from llm_response_cache. extract maps the API response
+# to the (JSON-serializable) value that is returned and cached.
+def create_chat_completion(call_site, extract, **params):
+    computed = []
+
+    def compute():
+        response = llm_client.chat_completion(call_site, **params)
+        computed.append(True)
+        record_llm_call(call_site, getattr(response, 'usage', None))
+        return extract(response)
+
+    if call_site not in CACHED_CALL_SITES:
+        return compute()
+    request_params = {key: value for key, value in params.items() if key not in ('model', 'messages')}
+    result = llm_response_cache.get_or_compute(params['model'], params['messages'], request_params, compute)
+    if not computed:
+        record_llm_call(call_site, cached=True)
+    return result
+
+
+# Parameters of the conversational chat completion calls
+CHAT_COMPLETION_PARAMS = dict(
+    model="gpt-3.5-turbo",     # Most cost-effective model for this use case
+    temperature=0.3,            # Lower for more consistent, focused responses
+    max_tokens=150,             # Sufficient for laptop recommendations
+    presence_penalty=0.1,       # Slight penalty to maintain context
+    frequency_penalty=0.2,      # Reduce repetitive suggestions
+    top_p=0.95                  # Slightly reduce randomness while maintaining quality
+)
+
+
 # The function encapsulates the chat Completion API call to Open AI
-def get_chat_model_completions(messages):
+@timed('chat_completion')
+def get_chat_model_completions(messages, call_site='chat'):
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",     # Most cost-effective model for this use case
+        return create_chat_completion(
+            call_site,
+            lambda response: response.choices[0].message.content,
             messages=messages,
-            temperature=0.3,            # Lower for more consistent, focused responses
-            max_tokens=150,             # Sufficient for laptop recommendations
-            presence_penalty=0.1,       # Slight penalty to maintain context
-            frequency_penalty=0.2,      # Reduce repetitive suggestions
-            top_p=0.95                  # Slightly reduce randomness while maintaining quality
+            **CHAT_COMPLETION_PARAMS
         )
-        return response.choices[0].message.content
     except Exception as e:
-        return f"Error in processing request: {str(e)}"
+        print(f"Chat completion failed: {str(e)}")
+        return LLM_UNAVAILABLE_MESSAGE
+
+
+# Generates the greeting that opens a conversation; unlike get_chat_model_completions
+# it raises on failure, so that GreetingCache keeps the previous greeting
+def generate_greeting():
+    return create_chat_completion(
+        'greeting',
+        lambda response: response.choices[0].message.content,
+        messages=initialize_conversation(),
+        **CHAT_COMPLETION_PARAMS
+    )
 
 
-# The following fucntion checks the user input for content inputed for moderation check
-def moderation_check(user_input):
+# Streaming variant of get_chat_model_completions: yields the reply text as tokens arrive
+@timed('chat_completion_stream')
+def stream_chat_model_completions(messages):
     try:
-        return "Flagged" if openai.moderations.create(input=user_input).results[0].flagged else "Not Flagged"
+        # The last chunk carries the token usage of the call
+        stream = llm_client.chat_completion('chat', messages=messages, stream=True,
+                                            stream_options={'include_usage': True}, **CHAT_COMPLETION_PARAMS)
+        usage = None
+        for chunk in stream:
+            usage = getattr(chunk, 'usage', None) or usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        record_llm_call('chat', usage)
     except Exception as e:
-        return "Error"
+        print(f"Streaming chat completion failed: {str(e)}")
+        yield LLM_UNAVAILABLE_MESSAGE
+
+
+# Token budget for the messages sent on every chat turn; older turns beyond it are folded
+# into a rolling summary while the system message and the most recent turns stay verbatim
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('SHOPASSIST_CONTEXT_TOKENS', 3000))
+CONTEXT_KEEP_RECENT_MESSAGES = int(os.environ.get('SHOPASSIST_CONTEXT_KEEP_RECENT', 6))
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+@functools.lru_cache(maxsize=None)
+def _get_token_encoding():
+    # tiktoken is optional; without it (or its encoding files) token counts are estimated
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=65536)
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text (memoized, so each message is counted once per process)."""
+    encoding = _get_token_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: list) -> int:
+    """Count the prompt tokens of a list of chat messages, including per-message overhead."""
+    return sum(4 + count_tokens(str(message.get('content') or '')) for message in messages) + 3
+
+
+@timed('summarize_conversation')
+def summarize_conversation(previous_summary: str, messages: list) -> str:
+    """Fold chat messages into the rolling summary of a conversation.
+
+    Args:
+        previous_summary (str): Summary of the turns folded so far (may be empty)
+        messages (list): Chat messages to add to the summary
+
+    Returns:
+        str: Updated summary
+    """
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = """
+    You maintain a running summary of a conversation between a laptop shopping assistant and a user.
+    Update the summary with the new messages. Keep every requirement, preference, budget figure,
+    laptop name and open question the user mentioned; drop greetings and filler.
+    Return only the updated summary, in at most 120 words.
+    """
+    return create_chat_completion(
+        'summary',
+        lambda response: response.choices[0].message.content.strip(),
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": f"Current summary: {previous_summary or 'None'}\n\nNew messages:\n{transcript}"}
+        ],
+        temperature=0.1,
+        max_tokens=200
+    )
+
+
+@timed('fit_conversation_to_budget')
+def fit_conversation_to_budget(messages: list, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                               keep_recent: int = CONTEXT_KEEP_RECENT_MESSAGES) -> list:
+    """Bound a conversation to token_budget by folding its oldest turns into a summary.
+
+    The first (system) message and the last keep_recent messages are always kept
+    verbatim; everything in between is replaced by a single system message holding a
+    rolling summary. Folding goes down to three quarters of the budget so that it runs
+    every few turns rather than on every turn. The list is updated in place, so the
+    stored conversation stays bounded too; if summarization fails it is left as is.
+
+    Args:
+        messages (list): Chat messages, starting with the system message
+        token_budget (int): Maximum prompt tokens to send
+        keep_recent (int): Number of most recent messages never folded
+
+    Returns:
+        list: The same list, for convenience
+    """
+    total_tokens = count_message_tokens(messages)
+    if total_tokens <= token_budget:
+        return messages
+
+    has_summary = len(messages) > 1 and str(messages[1].get('content', '')).startswith(SUMMARY_PREFIX)
+    first_turn = 2 if has_summary else 1
+    previous_summary = messages[1]['content'][len(SUMMARY_PREFIX):] if has_summary else ''
+
+    # Fold the oldest turns until the rest fits under the low watermark
+    target_tokens = token_budget * 3 // 4
+    fold_end = first_turn
+    while fold_end < len(messages) - keep_recent and total_tokens > target_tokens:
+        total_tokens -= 4 + count_tokens(str(messages[fold_end].get('content') or ''))
+        fold_end += 1
+    if fold_end == first_turn:
+        return messages
+
+    try:
+        summary = summarize_conversation(previous_summary, messages[first_turn:fold_end])
+    except Exception as e:
+        print(f"Conversation summarization failed: {str(e)}")
+        return messages
+    messages[1:fold_end] = [{"role": "system", "content": SUMMARY_PREFIX + summary}]
+    return messages
+
+
+# Sends one batch of texts to the moderation endpoint and returns their flagged verdicts
+def moderate_texts(texts):
+    response = llm_client.moderation(texts)
+    record_llm_call('moderation')
+    return [result.flagged for result in response.results]
+
+
+# Moderation checks of concurrent requests are batched and their verdicts cached; if the
+# endpoint fails, SHOPASSIST_MODERATION_FAIL=open (default) lets the text through and
+# closed treats it as flagged
+moderation_service = ModerationService(
+    moderate_texts,
+    batch_window=float(os.environ.get('SHOPASSIST_MODERATION_WINDOW', 0.01)),
+    max_batch=int(os.environ.get('SHOPASSIST_MODERATION_BATCH', 32)),
+    cache_size=int(os.environ.get('SHOPASSIST_MODERATION_CACHE_SIZE', 10000)),
+    fail_open=os.environ.get('SHOPASSIST_MODERATION_FAIL', 'open').lower() != 'closed'
+)
+registry.gauges('shopassist_moderation', 'Moderation service state', moderation_service.stats)
+
+
+# The following fucntion checks the user input for content inputed for moderation check
+@timed('moderation_check')
+def moderation_check(user_input):
+    return "Flagged" if moderation_service.is_flagged(user_input) else "Not Flagged"
 
 # The intent confirmation layer evaluates the output of the chat completion from Open AI API
+@timed('intent_confirmation_layer')
 def intent_confirmation_layer(response_assistant):
     prompt = """
     Verify if the input contains valid values for:
@@ -83,18 +317,22 @@ def intent_confirmation_layer(response_assistant):
     ]
 
     try:
-        confirmation = openai.chat.completions.create(
+        return create_chat_completion(
+            'intent_confirmation',
+            lambda confirmation: confirmation.choices[0].message.content,
             model="gpt-3.5-turbo",
             messages=messages,
             temperature=0.1,  # More deterministic
             max_tokens=5      # Only need Yes/No
         )
-        return confirmation.choices[0].message.content
     except Exception as e:
-        return "Error"
+        # Keep gathering requirements rather than acting on an unconfirmed summary
+        print(f"Intent confirmation failed: {str(e)}")
+        return "No"
 
 
 # The intent confirmation layer evaluates the output of the chat completion from Open AI API
+@timed('get_user_requirement_string')
 def get_user_requirement_string(response_assistant):
     prompt = """
             You are a helpful assistant that extracts structured user intent from a detailed message.
@@ -121,13 +359,13 @@ def get_user_requirement_string(response_assistant):
         {"role": "system", "content": prompt},
         {"role": "user", "content": f"Input: {response_assistant}"}
     ]
-    confirmation = openai.chat.completions.create(
+    return create_chat_completion(
+        'requirement_string',
+        lambda confirmation: confirmation.choices[0].message.content.strip(),
         model="gpt-3.5-turbo",
         messages=messages
     )
 
-    return confirmation.choices[0].message.content.strip()
-
 # Create custom function for using Open AI function calling
 shopassist_custom_functions = [
     {
@@ -173,6 +411,7 @@ shopassist_custom_functions = [
 ]
 
 # Calls OpenAI API to return the function calling parameters
+@timed('get_chat_completions_func_calling')
 def get_chat_completions_func_calling(input, include_budget):
     try:
         messages = [
@@ -180,7 +419,9 @@ def get_chat_completions_func_calling(input, include_budget):
             {"role": "user", "content": input}
         ]
 
-        response = openai.chat.completions.create(
+        arguments = create_chat_completion(
+            'function_calling',
+            lambda response: response.choices[0].message.function_call.arguments,
             model="gpt-3.5-turbo",
             messages=messages,
             functions=shopassist_custom_functions,
@@ -188,7 +429,7 @@ def get_chat_completions_func_calling(input, include_budget):
             temperature=0.1  # More consistent extraction
         )
 
-        params = json.loads(response.choices[0].message.function_call.arguments)
+        params = json.loads(arguments)
         budget = params['Budget'] if include_budget else 0
 
         return extract_user_info(
@@ -226,7 +467,125 @@ def extract_user_info(GPU_intensity, Display_quality, Portability, Multitasking,
         "Budget": Budget
     }
 
+# Fast path for the fixed-format summary sentence that initialize_conversation asks the model to emit
+REQUIREMENT_SENTENCE_PATTERN = re.compile(
+    r"I need a laptop with (?P<attributes>[^.]+?),?\s+and a budget of\s*"
+    r"(?:(?:rs\.?|inr|₹)\s*)?(?P<budget>\d[\d,]*)"
+    # The budget must end the sentence or carry a rupee suffix; "150000 USD" goes to the LLM
+    r"(?:\s*(?:inr|rs|rupees?)\b|\s*(?:\.(?!\d)|[\"']|\n|$))",
+    re.IGNORECASE
+)
+REQUIREMENT_ATTRIBUTE_PATTERN = re.compile(
+    r"^(?P<level>low|medium|high)\s+(?P<attribute>gpu intensity|display quality|portability|"
+    r"multi[\s-]?tasking|processing speed)$",
+    re.IGNORECASE
+)
+REQUIREMENT_ATTRIBUTE_NAMES = {
+    'gpu intensity': 'GPU intensity',
+    'display quality': 'Display quality',
+    'portability': 'Portability',
+    'multitasking': 'Multitasking',
+    'processing speed': 'Processing speed'
+}
+
+
+@timed('parse_user_requirement_sentence')
+def parse_user_requirement_sentence(response_assistant: str):
+    """Parse the requirement summary sentence locally, without calling the LLM.
+
+    Recognizes "I need a laptop with <level> GPU intensity, <level> display quality,
+    <level> portability, <level> multitasking, <level> processing speed and a budget
+    of <budget>." (attributes in any order, each exactly once) and validates the
+    values against the extract_user_info schema in shopassist_custom_functions.
+
+    Args:
+        response_assistant (str): Assistant message that may contain the summary
+
+    Returns:
+        dict or None: The extract_user_info dict, or None if the message does not
+                      contain a valid summary (the LLM chain should then be used)
+    """
+    match = REQUIREMENT_SENTENCE_PATTERN.search(response_assistant or '')
+    if match is None:
+        return None
+
+    values = {}
+    for item in re.split(r"\s*,\s*", match.group('attributes').strip()):
+        attribute_match = REQUIREMENT_ATTRIBUTE_PATTERN.match(item)
+        if attribute_match is None:
+            return None
+        attribute = re.sub(r"multi[\s-]?tasking", "multitasking", attribute_match.group('attribute').lower())
+        name = REQUIREMENT_ATTRIBUTE_NAMES[attribute]
+        if name in values:
+            return None
+        values[name] = attribute_match.group('level').lower()
+    values['Budget'] = int(match.group('budget').replace(',', ''))
+
+    schema = shopassist_custom_functions[0]['parameters']
+    if set(values) != set(schema['required']):
+        return None
+    for name, value in values.items():
+        spec = schema['properties'][name]
+        if 'enum' in spec and value not in spec['enum']:
+            return None
+        if 'minimum' in spec and value < spec['minimum']:
+            return None
+
+    return extract_user_info(
+        values['GPU intensity'],
+        values['Display quality'],
+        values['Portability'],
+        values['Multitasking'],
+        values['Processing speed'],
+        values['Budget']
+    )
+
+
+# Canonical requirement sentence, in the format produced by get_user_requirement_string
+def format_user_requirement_string(user_requirements: dict) -> str:
+    return (f"I need a laptop with {user_requirements['GPU intensity']} GPU intensity, "
+            f"{user_requirements['Display quality']} display quality, "
+            f"{user_requirements['Portability']} portability, "
+            f"{user_requirements['Multitasking']} multitasking, "
+            f"{user_requirements['Processing speed']} processing speed "
+            f"and a budget of {user_requirements['Budget']}.")
+
+# Concurrent sessions that reach the recommendation with the same profile share one
+# computation; set SHOPASSIST_SINGLEFLIGHT_LEASE to an SQLite file to share it between workers.
+# Once the catalog is loaded a recommendation is a table lookup, cheaper than the lease, so
+# the lease is only used while laptop_catalog.get() would (re)load and classify the inventory
+recommendation_flight = SingleFlight(
+    'recommendation',
+    lease_path=os.environ.get('SHOPASSIST_SINGLEFLIGHT_LEASE'),
+    lease_seconds=float(os.environ.get('SHOPASSIST_SINGLEFLIGHT_LEASE_SECONDS', 60))
+)
+registry.gauges('shopassist_singleflight_recommendation', 'Recommendation single-flight statistics',
+                recommendation_flight.stats)
+
+
+def recommendation_flight_key(user_requirements: dict, catalog_version: int) -> str:
+    """Key of a profile as the catalog sees it (encode_user_levels and the budget) and of
+    the inventory version it is computed from."""
+    # An absent attribute is not scored while an invalid one is UNKNOWN_LEVEL, so the mask is part of the key
+    user_levels, attribute_mask = encode_user_levels(user_requirements)
+    budget = str(user_requirements.get('Budget', '0')).strip()
+    return SingleFlight.make_key({'levels': user_levels.tolist(), 'mask': attribute_mask.tolist(),
+                                  'budget': int(budget) if budget.isdigit() else budget,
+                                  'catalog': catalog_version})
+
+
+def _recommend_laptops(user_requirements: dict) -> str:
+    # Shared, read-only catalog: prices and the SKU x attribute level matrix are precomputed
+    catalog = laptop_catalog.get()
+
+    # Top 3 within budget: a table lookup for full profiles, vectorized scoring otherwise
+    top_indices, top_scores = catalog.recommend(user_requirements, k=3)
+
+    return catalog.to_records_json(top_indices, top_scores)
+
+
 # Compare and find laptops that match user requirements
+@timed('compare_laptops_with_user')
 def compare_laptops_with_user(user_requirements: dict) -> str:
     """Compare user requirements with available laptops and return top matches.
 
@@ -241,42 +600,14 @@ def compare_laptops_with_user(user_requirements: dict) -> str:
         Exception: If there's an error in data processing or comparison
     """
     try:
-        # Load and preprocess laptop data
-        laptop_df = pd.read_csv('laptop_inventory.csv')
-        laptop_df['laptop_feature'] = laptop_df['Description'].apply(product_map_layer)
-
-        # Process budget and filter laptops
-        budget = int(user_requirements.get('Budget', '0'))
-        filtered_laptops = laptop_df.copy()
-        filtered_laptops['Price'] = filtered_laptops['Price'].str.replace(',', '').astype(int)
-        filtered_laptops = filtered_laptops[filtered_laptops['Price'] <= budget].copy()
-
-        # Define feature level mappings
-        mappings = {'low': 0, 'medium': 1, 'high': 2}
-        filtered_laptops['Score'] = 0
-
-        # Calculate scores for each laptop
-        for index, row in filtered_laptops.iterrows():
-            laptop_values = get_chat_completions_func_calling(row['laptop_feature'], False)
-            score = sum(
-                1 for key, user_value in user_requirements.items()
-                if key.lower() != 'budget'
-                and mappings.get(laptop_values.get(key, '').lower(), -1) >=
-                    mappings.get(user_value.lower(), -1)
-            )
-            filtered_laptops.loc[index, 'Score'] = score
-
-        # Get top 3 matches
-        top_laptops = (filtered_laptops
-                      .drop('laptop_feature', axis=1)
-                      .sort_values('Score', ascending=False)
-                      .head(3))
-
-        return top_laptops.to_json(orient='records')
+        key = recommendation_flight_key(user_requirements, laptop_catalog.file_version())
+        return recommendation_flight.do(key, lambda: _recommend_laptops(user_requirements),
+                                        across_workers=not laptop_catalog.is_current())
 
     except Exception as e:
         return json.dumps({"error": f"Comparison failed: {str(e)}"})
 
+@timed('recommendation_validation')
 def recommendation_validation(laptop_recommendation):
     data = json.loads(laptop_recommendation)
     data1 = []
@@ -286,21 +617,85 @@ def recommendation_validation(laptop_recommendation):
 
     return data1
 
-def initialize_conv_reco(products):
-    """Initialize conversation for laptop recommendations with product catalogue.
 
-   Args:
-       products (list): List of available laptop products with specifications
+follow_up_answers = registry.counter(
+    'shopassist_follow_up_answers_total', 'Recommendation follow-up questions by who answered them', ['source'])
 
-   Returns:
-       list: Initial conversation context with system message
 
-   Raises:
-       ValueError: If products list is empty or invalid
-   """
-    system_message = f"""
+@timed('answer_follow_up')
+def answer_follow_up(user_input: str, top_3_laptops: str):
+    """Answer a factual follow-up question about the recommendations without the LLM.
+
+    Attribute lookups, superlatives, comparisons and feature questions about the
+    recommended laptops (or the whole catalog) are answered from a local search index.
+
+    Returns:
+        str or None: The answer, or None when the question has to go to the LLM
+    """
+    try:
+        answer = route_follow_up(user_input, recommendation_validation(top_3_laptops),
+                                 lambda: catalog_search_for(laptop_catalog.get()))
+    except Exception as e:
+        print(f"Local follow-up answer failed: {str(e)}")
+        answer = None
+    follow_up_answers.inc('llm' if answer is None else 'local')
+    return answer
+
+# Compact catalogue fields: short key -> inventory columns, and the profile attribute
+# (if any) that makes the field relevant; fields of attributes the user rated low are dropped
+COMPACT_PRODUCT_FIELDS = [
+    ('cpu', ['Core', 'CPU Manufacturer', 'Clock Speed'], 'Processing speed'),
+    ('ram', ['RAM Size'], 'Multitasking'),
+    ('gpu', ['Graphics Processor'], 'GPU intensity'),
+    ('disp', ['Display Size', 'Screen Resolution', 'Display Type'], 'Display quality'),
+    ('wt', ['Laptop Weight'], 'Portability'),
+    ('bat', ['Average Battery Life'], None),
+    ('stor', ['Storage Type'], None),
+    ('os', ['OS'], None),
+    ('feat', ['Special Features'], None),
+    ('warr', ['Warranty'], None),
+]
+MEASURE_PROMPT_TOKENS = os.environ.get('SHOPASSIST_MEASURE_PROMPT', '') == '1'
+
+
+def encode_products_compact(products: list, user_requirements: dict = None, description_chars: int = 0) -> str:
+    """Serialize laptops as one short line each for the recommendation system prompt.
+
+    Args:
+        products (list): Laptop records as returned by recommendation_validation
+        user_requirements (dict, optional): User profile; fields tied to an attribute the
+                                            user rated 'low' are left out
+        description_chars (int): Keep at most this many characters of each Description
+                                 (0 drops descriptions)
+
+    Returns:
+        str: One line per laptop, e.g. "1. Dell Inspiron | price=35000 | cpu=i5 Intel 2.4 GHz | ..."
+    """
+    user_requirements = user_requirements or {}
+    lines = []
+    for number, product in enumerate(products, start=1):
+        fields = [f"{number}. {product.get('Brand', '')} {product.get('Model Name', '')}".rstrip(),
+                  f"price={product.get('Price', '')}"]
+        for key, columns, attribute in COMPACT_PRODUCT_FIELDS:
+            if attribute and str(user_requirements.get(attribute, '')).lower() == 'low':
+                continue
+            value = ' '.join(str(product[column]) for column in columns if product.get(column) not in (None, ''))
+            if value:
+                fields.append(f"{key}={value}")
+        if description_chars and product.get('Description'):
+            description = product['Description']
+            if len(description) > description_chars:
+                description = description[:description_chars].rsplit(' ', 1)[0] + '...'
+            fields.append(f"desc={description}")
+        lines.append(' | '.join(fields))
+    return '\n'.join(lines)
+
+
+# Recommendation system prompt around a serialized catalogue
+def _conv_reco_system_message(catalogue):
+    return f"""
     You are an intelligent laptop gadget expert and you are tasked with the objective to \
-    solve the user queries about any product from the catalogue: {products}.\
+    solve the user queries about any product from the catalogue: {catalogue}.\
     You should keep the user profile in mind while answering the questions.\
 
     Start with a brief summary of each laptop in the following format, in decreasing order of price of laptops:
@@ -308,31 +703,59 @@ def initialize_conv_reco(products):
     2. <Laptop Name> : <Major specifications of the laptop>, <Price in Rs>
 
     """
-    conversation = [{"role": "system", "content": system_message }]
-    return conversation
 
-def product_map_layer(laptop_description: str) -> str:
-    """Map laptop description to standardized feature classifications.
 
-    Args:
-        laptop_description (str): Raw laptop description text
+def measure_conv_reco_tokens(products: list, user_requirements: dict = None) -> dict:
+    """Report the prompt tokens of the recommendation system message with the raw
+    product records and with the compact encoding."""
+    raw_tokens = count_message_tokens([{"role": "system", "content": _conv_reco_system_message(products)}])
+    compact_catalogue = "\n" + encode_products_compact(products, user_requirements) + "\n"
+    compact_tokens = count_message_tokens([{"role": "system", "content": _conv_reco_system_message(compact_catalogue)}])
+    return {
+        'raw_tokens': raw_tokens,
+        'compact_tokens': compact_tokens,
+        'saved_ratio': 1 - compact_tokens / raw_tokens if raw_tokens else 0.0
+    }
 
-    Returns:
-        str: Standardized laptop feature string with classifications
 
-    Raises:
-        Exception: If classification process fails
-    """
-    try:
-        delimiter = "#####"
-        lap_spec = ("Laptop with (Type of the Graphics Processor) GPU intensity, "
-                   "(Display Type, Screen Resolution, Display Size) display quality, "
-                   "(Laptop Weight) portability, (RAM Size) multi tasking, "
-                   "(CPU Type, Core, Clock Speed) processing speed")
+@timed('initialize_conv_reco')
+def initialize_conv_reco(products, user_requirements=None):
+    """Initialize conversation for laptop recommendations with product catalogue.
 
-        values = {'low', 'medium', 'high'}
+   The catalogue is serialized with encode_products_compact (short keyed fields, only
+   the attributes relevant to the user's profile, no descriptions). Set
+   SHOPASSIST_MEASURE_PROMPT=1 to log the prompt tokens before and after compaction.
 
-        classification_rules = f"""
+   Args:
+       products (list): List of available laptop products with specifications
+       user_requirements (dict, optional): User profile used to pick the relevant fields
+
+   Returns:
+       list: Initial conversation context with system message
+
+   Raises:
+       ValueError: If products list is empty or invalid
+   """
+    if not isinstance(user_requirements, dict) or 'error' in user_requirements:
+        user_requirements = None
+    if MEASURE_PROMPT_TOKENS:
+        print(f"Recommendation prompt tokens: {measure_conv_reco_tokens(products, user_requirements)}")
+
+    catalogue = "\n" + encode_products_compact(products, user_requirements) + "\n"
+    system_message = _conv_reco_system_message(catalogue)
+    conversation = [{"role": "system", "content": system_message }]
+    return conversation
+
+# Classification prompt used by product_map_layer to map a laptop description to feature levels;
+# the text, including its indentation, is what the model is sent, so keep it byte for byte
+def get_product_map_prompt():
+    delimiter = "#####"
+    lap_spec = ("Laptop with (Type of the Graphics Processor) GPU intensity, "
+               "(Display Type, Screen Resolution, Display Size) display quality, "
+               "(Laptop Weight) portability, (RAM Size) multi tasking, "
+               "(CPU Type, Core, Clock Speed) processing speed")
+
+    classification_rules = f"""
         GPU Intensity:
         - low: entry-level (integrated graphics, Intel UHD)
         - medium: mid-range (M1, AMD Radeon, Intel Iris)
@@ -359,14 +782,14 @@ def product_map_layer(laptop_description: str) -> str:
         - high: Intel Core i7+, AMD Ryzen 7+
         """
 
-        example = {
-            "input": "Dell Inspiron with Intel Core i5 @ 2.4GHz, 8GB RAM, "
-                    "1920x1080 display, 2.5kg weight, Intel UHD GPU",
-            "output": "Laptop with medium GPU intensity, medium display quality, "
-                     "medium portability, low multitasking, medium processing speed"
-        }
+    example = {
+        "input": "Dell Inspiron with Intel Core i5 @ 2.4GHz, 8GB RAM, "
+                "1920x1080 display, 2.5kg weight, Intel UHD GPU",
+        "output": "Laptop with medium GPU intensity, medium display quality, "
+                 "medium portability, low multitasking, medium processing speed"
+    }
 
-        prompt = f"""
+    return f"""
         Classify laptop features based on description.
         Rules: {delimiter}\n{classification_rules}\n{delimiter}
         Example: {delimiter}\n{example['input']}\n{example['output']}\n{delimiter}
@@ -374,12 +797,186 @@ def product_map_layer(laptop_description: str) -> str:
         Note: Use only low/medium/high values.
         """
 
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": f"Classify: {laptop_description}"}
-        ]
+@timed('product_map_layer')
+def product_map_layer(laptop_description: str) -> str:
+    """Map laptop description to standardized feature classifications.
+
+    Args:
+        laptop_description (str): Raw laptop description text
+
+    Returns:
+        str: Standardized laptop feature string with classifications
 
-        return get_chat_model_completions(messages)
+    Raises:
+        Exception: If the classification call fails
+    """
+    messages = [
+        {"role": "system", "content": get_product_map_prompt()},
+        {"role": "user", "content": f"Classify: {laptop_description}"}
+    ]
+
+    return create_chat_completion(
+        'product_map',
+        lambda response: response.choices[0].message.content,
+        messages=messages,
+        **CHAT_COMPLETION_PARAMS
+    )
+
+
+# Persistent store of catalog classifications, keyed by a content hash of the laptop
+# Description and the classifier prompt version so that only changed rows are re-classified
+CLASSIFICATION_CACHE_FILE = os.environ.get('SHOPASSIST_CLASSIFICATION_CACHE', 'classification_cache.json')
+_classification_cache = None
+_classification_cache_lock = threading.Lock()
+classification_lookups = registry.counter(
+    'shopassist_classification_lookups_total', 'Laptop classification store lookups', ['result'])
+
+
+@functools.lru_cache(maxsize=None)
+def get_classifier_prompt_version() -> str:
+    """Return a hash identifying the prompts and schema used to classify a laptop.
+
+    Any edit to the classification rules or the function calling schema changes the
+    version, which invalidates every cached classification made with the old prompts.
+    """
+    prompt_material = get_product_map_prompt() + json.dumps(shopassist_custom_functions, sort_keys=True)
+    return hashlib.sha256(prompt_material.encode('utf-8')).hexdigest()[:16]
+
+
+def classification_cache_key(laptop_description: str) -> str:
+    """Return the cache key for a laptop Description under the current prompt version."""
+    material = f"{get_classifier_prompt_version()}\n{laptop_description}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def use_classification_cache(path: str):
+    """Switch the classification store to another file, dropping the one in memory."""
+    global CLASSIFICATION_CACHE_FILE, _classification_cache
+    with _classification_cache_lock:
+        CLASSIFICATION_CACHE_FILE = path
+        _classification_cache = None
+
+
+def load_classification_cache(path: str = None) -> dict:
+    """Load the on-disk classification store into memory (once per process).
+
+    Args:
+        path (str, optional): Location of the JSON store (default CLASSIFICATION_CACHE_FILE)
+
+    Returns:
+        dict: Mapping of cache key to the laptop feature classification
+    """
+    global _classification_cache
+    with _classification_cache_lock:
+        if _classification_cache is None:
+            try:
+                with open(path or CLASSIFICATION_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _classification_cache = json.load(f)
+            except (OSError, ValueError):
+                _classification_cache = {}
+        return _classification_cache
 
+
+def save_classification_cache(path: str = None):
+    """Atomically write the classification store to disk.
+
+    Args:
+        path (str, optional): Location of the JSON store (default CLASSIFICATION_CACHE_FILE)
+    """
+    cache = load_classification_cache(path)
+    with _classification_cache_lock:
+        path = path or CLASSIFICATION_CACHE_FILE
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+
+
+@timed('classify_laptop_description')
+def classify_laptop_description(laptop_description: str) -> dict:
+    """Return the low/medium/high feature levels of a laptop, using the persistent store.
+
+    The Description is classified with product_map_layer and
+    get_chat_completions_func_calling only on a cache miss; failed classifications are
+    returned but never stored, so they are retried on the next request.
+
+    Args:
+        laptop_description (str): Raw laptop description text
+
+    Returns:
+        dict: Feature levels in the extract_user_info format (Budget is 0)
+    """
+    cache = load_classification_cache()
+    key = classification_cache_key(laptop_description)
+    with _classification_cache_lock:
+        cached = cache.get(key)
+    if cached is not None:
+        classification_lookups.inc('hit')
+        return cached
+
+    classification_lookups.inc('miss')
+    try:
+        laptop_map = product_map_layer(laptop_description)
     except Exception as e:
-        return f"Classification failed: {str(e)}"
+        print(f"Laptop classification failed: {str(e)}")
+        return {"error": f"Classification failed: {str(e)}"}
+    laptop_values = get_chat_completions_func_calling(laptop_map, False)
+    if 'error' not in laptop_values:
+        with _classification_cache_lock:
+            cache[key] = laptop_values
+    return laptop_values
+
+
+@timed('get_laptop_feature_levels')
+def get_laptop_feature_levels(laptop_df: pd.DataFrame) -> pd.DataFrame:
+    """Return the feature level index of every laptop in the DataFrame.
+
+    Levels come from the deterministic rule classifier on the structured columns.
+    Attributes of rows the rules could not parse are filled from the precomputed levels
+    of an enriched inventory (written by BatchClassifier.py for the current prompt
+    version) and, failing that, from the LLM classification through the persistent store.
+
+    Args:
+        laptop_df (pd.DataFrame): Laptop inventory rows
+
+    Returns:
+        pd.DataFrame: One column per feature in FEATURE_COLUMNS (0 = low, 1 = medium,
+                      2 = high, UNKNOWN_LEVEL when neither classifier produced a value);
+                      attrs[FAILED_CLASSIFICATIONS_ATTR] counts the rows whose LLM
+                      classification failed
+    """
+    feature_levels = classify_laptop_features(laptop_df)
+    unparsed = (feature_levels == UNKNOWN_LEVEL).any(axis=1)
+
+    # Enriched inventories (BatchClassifier.py) carry precomputed levels for the current prompts
+    if unparsed.any() and CLASSIFIER_VERSION_COLUMN in laptop_df.columns:
+        current = laptop_df[CLASSIFIER_VERSION_COLUMN].astype(str) == get_classifier_prompt_version()
+        for key in FEATURE_COLUMNS:
+            enriched_levels = laptop_df[key].astype(str).str.lower().map(LEVEL_MAPPING)
+            fill = current & (feature_levels[key] == UNKNOWN_LEVEL) & enriched_levels.notna()
+            feature_levels.loc[fill, key] = enriched_levels[fill].astype('int8')
+        unparsed = (feature_levels == UNKNOWN_LEVEL).any(axis=1)
+    cache = load_classification_cache()
+    with _classification_cache_lock:
+        cached_before = len(cache)
+
+    failed = 0
+    for index in feature_levels.index[unparsed]:
+        laptop_values = classify_laptop_description(laptop_df.at[index, 'Description'])
+        failed += 'error' in laptop_values
+        for key in FEATURE_COLUMNS:
+            if feature_levels.at[index, key] == UNKNOWN_LEVEL:
+                feature_levels.at[index, key] = LEVEL_MAPPING.get(
+                    str(laptop_values.get(key, '')).lower(), UNKNOWN_LEVEL)
+    with _classification_cache_lock:
+        changed = len(cache) != cached_before
+    if changed:
+        save_classification_cache()
+    # Reported to the catalog, which rebuilds the snapshot later to retry these rows
+    feature_levels.attrs[FAILED_CLASSIFICATIONS_ATTR] = failed
+    return feature_levels
+
+
+# Inventory loaded once per process and reloaded only when laptop_inventory.csv changes
+laptop_catalog = LaptopCatalog(os.environ.get('SHOPASSIST_INVENTORY', 'laptop_inventory.csv'),
+                               classifier=get_laptop_feature_levels)
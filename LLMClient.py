@@ -0,0 +1,228 @@
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from Metrics import registry
+
+llm_retries = registry.counter('shopassist_llm_retries_total', 'Retried LLM API calls', ['call_site'])
+llm_circuit_rejections = registry.counter(
+    'shopassist_llm_circuit_rejections_total', 'LLM calls failed fast by the open circuit breaker', ['call_site'])
+llm_hedged_requests = registry.counter('shopassist_llm_hedged_requests_total', 'Hedged LLM requests sent', ['call_site'])
+
+# Overall deadline (seconds) of each call site, retries included
+CALL_SITE_DEADLINES = {
+    'chat': 20.0,
+    'summary': 15.0,
+    'intent_confirmation': 10.0,
+    'requirement_string': 10.0,
+    'function_calling': 15.0,
+    'product_map': 30.0,
+    'moderation': 5.0
+}
+DEFAULT_DEADLINE = 20.0
+
+# Call sites on the user's critical path, where a hedged request may be sent
+HEDGED_CALL_SITES = {'chat'}
+
+# Read when the OpenAI client is first needed, unless openai.api_key or OPENAI_API_KEY is set
+API_KEY_FILE = os.environ.get('SHOPASSIST_OPENAI_KEY_FILE', 'OpenAI_API_Key.txt')
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls fail fast
+    for reset_seconds; then a single probe call is let through (half-open), which
+    closes the circuit on success or opens it again on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """Return whether a call may go to the upstream now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, rate limits and 5xx responses are worth retrying."""
+    openai = sys.modules.get('openai')
+    if openai is None:
+        return False  # Not an OpenAI error if the SDK was never imported
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409, 429)
+    return False
+
+
+class LLMClient:
+    """Shared OpenAI client used by every call site of the app.
+
+    One underlying OpenAI client (and so one pool of keep-alive HTTPS connections) is
+    created lazily and reused by all threads. Each call gets the deadline of its call
+    site, retryable errors are retried with jittered exponential backoff within that
+    deadline, and a circuit breaker makes calls fail fast while the upstream is
+    degraded. With hedge_after set, a second identical request is sent for the hedged
+    call sites when the first has not answered after hedge_after seconds, and the
+    first response to arrive is used.
+    """
+
+    def __init__(self, client=None, max_retries: int = 2, base_backoff: float = 0.25, max_backoff: float = 4.0,
+                 hedge_after: float = None, breaker: CircuitBreaker = None, deadlines: dict = None):
+        """
+        Args:
+            client (optional): Object exposing chat.completions.create and moderations.create;
+                               defaults to a pooled openai.OpenAI client
+            max_retries (int): Retries after the first attempt of a call
+            base_backoff (float): Backoff before the first retry, doubled on each retry
+            max_backoff (float): Upper bound of a single backoff
+            hedge_after (float, optional): Seconds before a hedged request is sent; None disables hedging
+            breaker (CircuitBreaker, optional): Circuit breaker shared by all call sites
+            deadlines (dict, optional): Deadline in seconds per call site
+        """
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.deadlines = {**CALL_SITE_DEADLINES, **(deadlines or {})}
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._hedge_executor = None
+
+    def set_client(self, client):
+        """Replace the underlying client (None goes back to the pooled OpenAI client)."""
+        with self._client_lock:
+            self._client = client
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                # Created on first use, so importing the app neither loads the SDK nor reads
+                # the key; retries and timeouts are handled here rather than by the SDK
+                import openai
+                self._client = openai.OpenAI(api_key=read_api_key(openai.api_key), max_retries=0)
+            return self._client
+
+    def chat_completion(self, call_site: str, **params):
+        """Create a chat completion for call_site, with retries, deadline and circuit breaker."""
+        create = self.client.chat.completions.create
+        if self.hedge_after is not None and call_site in HEDGED_CALL_SITES and not params.get('stream'):
+            return self._call(call_site, lambda timeout: self._hedged(call_site, create, timeout, params))
+        return self._call(call_site, lambda timeout: create(timeout=timeout, **params))
+
+    def moderation(self, inputs):
+        """Run the moderation endpoint on a text or list of texts, with retries, deadline and circuit breaker."""
+        moderations = self.client.moderations
+        return self._call('moderation', lambda timeout: moderations.create(input=inputs, timeout=timeout))
+
+    def _call(self, call_site: str, attempt):
+        deadline = time.monotonic() + self.deadlines.get(call_site, DEFAULT_DEADLINE)
+        for retry in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                llm_circuit_rejections.inc(call_site)
+                raise CircuitOpenError(f"OpenAI circuit open, {call_site} call not sent")
+            remaining = deadline - time.monotonic()
+            try:
+                result = attempt(remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; the request itself is at fault
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                # Full jitter keeps retries from many threads from arriving in lockstep
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** retry))
+                if retry == self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+                llm_retries.inc(call_site)
+                time.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _hedged(self, call_site: str, create, timeout: float, params: dict):
+        if self._hedge_executor is None:
+            with self._client_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='llm-hedge')
+        started = time.monotonic()
+        futures = {self._hedge_executor.submit(create, timeout=timeout, **params)}
+        done, _ = wait(futures, timeout=min(self.hedge_after, timeout))
+        if not done:
+            remaining = timeout - (time.monotonic() - started)
+            llm_hedged_requests.inc(call_site)
+            futures.add(self._hedge_executor.submit(create, timeout=remaining, **params))
+        # The first successful response wins; the other request finishes in the background
+        error = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+def read_api_key(api_key: str = None) -> str:
+    """Return api_key, else $OPENAI_API_KEY, else the contents of API_KEY_FILE."""
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    if not api_key and os.path.exists(API_KEY_FILE):
+        with open(API_KEY_FILE, 'r') as f:
+            api_key = f.read().strip()
+    return api_key
+
+
+def create_llm_client() -> LLMClient:
+    """Create the shared client configured by the SHOPASSIST_LLM_* environment variables."""
+    hedge_after = os.environ.get('SHOPASSIST_LLM_HEDGE_AFTER')
+    return LLMClient(
+        max_retries=int(os.environ.get('SHOPASSIST_LLM_RETRIES', 2)),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get('SHOPASSIST_LLM_BREAKER_FAILURES', 5)),
+            reset_seconds=float(os.environ.get('SHOPASSIST_LLM_BREAKER_RESET', 30))
+        )
+    )
@@ -0,0 +1,513 @@
+from __future__ import annotations
+
+import bisect
+import importlib
+import itertools
+import os
+import re
+import threading
+import time
+
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    numpy and pandas take most of the app's import time; they are loaded when the
+    catalog is first used, and the module global is then rebound to the real module.
+    """
+
+    def __init__(self, name: str, alias: str):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attribute)
+
+
+np = _LazyModule('numpy', 'np')
+pd = _LazyModule('pandas', 'pd')
+
+# Attributes of the user profile and the low/medium/high levels they can take
+FEATURE_COLUMNS = ['GPU intensity', 'Display quality', 'Portability', 'Multitasking', 'Processing speed']
+LEVELS = ['low', 'medium', 'high']
+LEVEL_MAPPING = {level: index for index, level in enumerate(LEVELS)}
+UNKNOWN_LEVEL = -1
+# feature_levels.attrs key where a classifier reports how many rows it failed to classify
+# (e.g. the LLM fallback was unavailable); such snapshots are rebuilt after a backoff
+FAILED_CLASSIFICATIONS_ATTR = 'failed_classifications'
+
+# Columns added by the batch classifier (BatchClassifier.py) to an enriched inventory file
+CLASSIFIER_VERSION_COLUMN = 'Classifier Prompt Version'
+ENRICHED_COLUMNS = FEATURE_COLUMNS + [CLASSIFIER_VERSION_COLUMN]
+
+
+# GPU Intensity: low = Intel UHD / integrated, medium = M1, AMD Radeon, Intel Iris, high = Nvidia RTX
+def _classify_gpu(laptop_df: pd.DataFrame) -> np.ndarray:
+    gpu = laptop_df['Graphics Processor'].fillna('').astype(str).str.lower()
+    return np.select(
+        [
+            gpu.str.contains('nvidia') & gpu.str.contains(r'\brtx\b'),
+            gpu.str.contains(r'\bm1\b') | gpu.str.contains('radeon') | gpu.str.contains('iris'),
+            gpu.str.contains('uhd') | gpu.str.contains('integrated'),
+        ],
+        [2, 1, 0],
+        default=UNKNOWN_LEVEL
+    )
+
+
+# Display Quality: low = below Full HD, medium = Full HD or higher, high = 4K, Retina, HDR
+def _classify_display(laptop_df: pd.DataFrame) -> np.ndarray:
+    display_type = laptop_df['Display Type'].fillna('').astype(str).str.lower()
+    resolution = (laptop_df['Screen Resolution'].fillna('').astype(str)
+                  .str.extract(r'(\d+)\s*[xX×]\s*(\d+)').astype(float))
+    width, height = resolution[0], resolution[1]
+    return np.select(
+        [
+            display_type.str.contains(r'retina|hdr|\b4k\b') | ((width >= 3840) & (height >= 2160)),
+            (width >= 1920) & (height >= 1080),
+            width.notna() & height.notna(),
+        ],
+        [2, 1, 0],
+        default=UNKNOWN_LEVEL
+    )
+
+
+# Portability: high = < 1.51 kg, medium = 1.51 - 2.51 kg, low = > 2.51 kg
+def _classify_portability(laptop_df: pd.DataFrame) -> np.ndarray:
+    weight = (laptop_df['Laptop Weight'].fillna('').astype(str)
+              .str.extract(r'(\d+(?:\.\d+)?)\s*kg', flags=re.IGNORECASE)[0].astype(float))
+    return np.select(
+        [weight < 1.51, weight <= 2.51, weight > 2.51],
+        [2, 1, 0],
+        default=UNKNOWN_LEVEL
+    )
+
+
+# Multitasking: low = 8GB, 12GB RAM, medium = 16GB RAM, high = 32GB, 64GB RAM
+def _classify_multitasking(laptop_df: pd.DataFrame) -> np.ndarray:
+    ram = (laptop_df['RAM Size'].fillna('').astype(str)
+           .str.extract(r'(\d+)\s*GB', flags=re.IGNORECASE)[0].astype(float))
+    return np.select(
+        [ram >= 32, ram >= 16, ram > 0],
+        [2, 1, 0],
+        default=UNKNOWN_LEVEL
+    )
+
+
+# Processing Speed: low = Intel Core i3, AMD Ryzen 3, medium = i5, Ryzen 5, high = i7+, Ryzen 7+
+def _classify_processing(laptop_df: pd.DataFrame) -> np.ndarray:
+    core = laptop_df['Core'].fillna('').astype(str).str.lower()
+    manufacturer = laptop_df['CPU Manufacturer'].fillna('').astype(str).str.lower()
+    intel_tier = core.str.extract(r'^(?:core\s*)?i([3579])\b')[0].astype(float)
+    ryzen_tier = core.str.extract(r'ryzen\s*([3579])\b')[0].astype(float)
+    tier = intel_tier.where(manufacturer != 'amd').fillna(ryzen_tier.where(manufacturer != 'intel'))
+    return np.select(
+        [tier >= 7, tier == 5, tier == 3],
+        [2, 1, 0],
+        default=UNKNOWN_LEVEL
+    )
+
+
+def classify_laptop_features(laptop_df: pd.DataFrame) -> pd.DataFrame:
+    """Classify every laptop into low/medium/high feature levels from its structured columns.
+
+    This applies the same classification rules as product_map_layer, but to the
+    Graphics Processor, Display Type, Screen Resolution, Laptop Weight, RAM Size, Core
+    and CPU Manufacturer columns of the whole inventory in one vectorized pass.
+
+    Args:
+        laptop_df (pd.DataFrame): Laptop inventory as read from laptop_inventory.csv
+
+    Returns:
+        pd.DataFrame: One int8 column per feature in FEATURE_COLUMNS holding the level
+                      index (0 = low, 1 = medium, 2 = high), or UNKNOWN_LEVEL where the
+                      column could not be parsed by the rules
+    """
+    return pd.DataFrame({
+        'GPU intensity': _classify_gpu(laptop_df),
+        'Display quality': _classify_display(laptop_df),
+        'Portability': _classify_portability(laptop_df),
+        'Multitasking': _classify_multitasking(laptop_df),
+        'Processing speed': _classify_processing(laptop_df),
+    }, index=laptop_df.index).astype(np.int8)
+
+
+def encode_user_levels(user_requirements: dict):
+    """Encode a user profile as a level vector over FEATURE_COLUMNS.
+
+    Args:
+        user_requirements (dict): Profile in the extract_user_info format
+
+    Returns:
+        tuple: (np.ndarray of int8 levels, np.ndarray of bool marking the attributes
+               present in the profile; absent attributes are not scored)
+    """
+    user_levels = np.array(
+        [LEVEL_MAPPING.get(str(user_requirements.get(key, '')).lower(), UNKNOWN_LEVEL)
+         for key in FEATURE_COLUMNS],
+        dtype=np.int8
+    )
+    attribute_mask = np.array([key in user_requirements for key in FEATURE_COLUMNS])
+    return user_levels, attribute_mask
+
+
+def score_laptops(feature_levels: np.ndarray, user_levels: np.ndarray, attribute_mask=None) -> np.ndarray:
+    """Score every laptop by the number of attributes meeting the user's level.
+
+    Args:
+        feature_levels (np.ndarray): SKUs x FEATURE_COLUMNS matrix of level indices
+                                     (column-major order is fastest)
+        user_levels (np.ndarray): Level index required by the user for each attribute
+        attribute_mask (np.ndarray, optional): Attributes to score (defaults to all)
+
+    Returns:
+        np.ndarray: int8 score per SKU
+    """
+    # Accumulate one attribute column at a time: a reduction along the short axis of a
+    # SKUs x 5 matrix is several times slower than five contiguous column comparisons
+    scores = np.zeros(feature_levels.shape[0], dtype=np.int8)
+    for column, user_level in enumerate(user_levels):
+        if attribute_mask is None or attribute_mask[column]:
+            scores += feature_levels[:, column] >= user_level
+    return scores
+
+
+def select_top_k(scores: np.ndarray, prices: np.ndarray, budget: int, k: int = 3) -> np.ndarray:
+    """Return the indices of the k best laptops within the budget.
+
+    Laptops are ranked by score (highest first); ties are broken by price (cheapest
+    first) and then by catalog order, so the result is deterministic. Only the k
+    best candidates are ordered, the rest are separated out with a linear partition.
+
+    Args:
+        scores (np.ndarray): Score per SKU
+        prices (np.ndarray): Price per SKU
+        budget (int): Maximum price
+        k (int): Number of laptops to return
+
+    Returns:
+        np.ndarray: Catalog row indices of the top k laptops, best first
+    """
+    candidates = np.flatnonzero(prices <= budget)
+    if candidates.size == 0 or k <= 0:
+        return candidates[:0]
+
+    candidate_prices = prices[candidates].astype(np.int64)
+    min_price = candidate_prices.min()
+    price_span = int(candidate_prices.max() - min_price) + 1
+    rank_key = (len(FEATURE_COLUMNS) - scores[candidates].astype(np.int64)) * price_span + (candidate_prices - min_price)
+
+    if candidates.size > k:
+        kth_key = np.partition(rank_key, k - 1)[k - 1]
+        selected = np.flatnonzero(rank_key < kth_key)
+        tied = np.flatnonzero(rank_key == kth_key)[:k - selected.size]
+        selected = np.concatenate([selected, tied])
+    else:
+        selected = np.arange(candidates.size)
+
+    order = np.lexsort((selected, rank_key[selected]))
+    return candidates[selected[order]]
+
+
+def read_inventory(path: str) -> pd.DataFrame:
+    """Read a laptop inventory file; Parquet by extension, CSV otherwise."""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+class RecommendationTable:
+    """Precomputed top-k laptops for every full user profile and budget breakpoint.
+
+    A profile sets each attribute in FEATURE_COLUMNS to low, medium or high, so there
+    are only 3^5 = 243 of them, and the ranking only changes at the distinct catalog
+    prices. The table stores, for every (profile, price breakpoint), the same top-k
+    that select_top_k would return for a budget at that breakpoint, so a
+    recommendation becomes one lookup plus a bisect on the sorted price list.
+    """
+
+    def __init__(self, feature_levels: np.ndarray, prices: np.ndarray, k: int = 3, previous=None):
+        """
+        Args:
+            feature_levels (np.ndarray): SKUs x FEATURE_COLUMNS level matrix
+            prices (np.ndarray): Price per SKU
+            k (int): Number of laptops per entry
+            previous (tuple, optional): (RecommendationTable, feature_levels, prices)
+                of the catalog this one replaces; entries for breakpoints below the
+                lowest old or new price of a changed SKU are reused instead of rebuilt
+        """
+        self.k = k
+        self.profiles = np.array(list(itertools.product(range(len(LEVELS)), repeat=len(FEATURE_COLUMNS))),
+                                 dtype=np.int8)
+        self.profile_index = {tuple(profile): index for index, profile in enumerate(self.profiles.tolist())}
+
+        # Rows in (price, catalog order) order: the order in which a growing budget admits them
+        sku_count = len(prices)
+        self._order = np.lexsort((np.arange(sku_count), prices))
+        sorted_prices = prices[self._order]
+        self.breakpoints = np.unique(sorted_prices).tolist()
+        self._ends = np.searchsorted(sorted_prices, self.breakpoints, side='right').tolist()
+        self.entries = np.full((len(self.profiles), len(self.breakpoints), k), -1, dtype=np.int32)
+        self.rebuilt_breakpoints = len(self.breakpoints)
+
+        first_breakpoint = self._reuse_unchanged(feature_levels, prices, previous)
+        self.rebuilt_breakpoints = len(self.breakpoints) - first_breakpoint
+        if self.rebuilt_breakpoints:
+            self._build(feature_levels, first_breakpoint)
+
+    def _reuse_unchanged(self, feature_levels, prices, previous) -> int:
+        """Copy entries that cannot have changed from the previous table.
+
+        Returns:
+            int: Index of the first breakpoint that still has to be built
+        """
+        if previous is None:
+            return 0
+        old_table, old_levels, old_prices = previous
+        if old_table.k != self.k or len(old_prices) != len(prices):
+            return 0
+
+        changed = (old_prices != prices) | (old_levels != feature_levels).any(axis=1)
+        if changed.any():
+            # Below this price the set of affordable SKUs and their levels is identical
+            min_changed_price = min(old_prices[changed].min(), prices[changed].min())
+            reusable = bisect.bisect_left(self.breakpoints, min_changed_price)
+        else:
+            reusable = len(self.breakpoints)
+        # Unchanged SKUs keep their price, so these breakpoints exist in both tables
+        old_position = {price: index for index, price in enumerate(old_table.breakpoints)}
+        old_positions = [old_position[price] for price in self.breakpoints[:reusable]]
+        self.entries[:, :reusable] = old_table.entries[:, old_positions]
+        return reusable
+
+    def _build(self, feature_levels: np.ndarray, first_breakpoint: int):
+        # At a breakpoint the admitted SKUs are a prefix of the admission order, so the
+        # top-k is, for each score from highest to lowest, the earliest admitted SKUs
+        # with that score. Only the first k SKUs of every score group can qualify.
+        ends = np.asarray(self._ends[first_breakpoint:])[:, None]
+        sku_count = len(self._order)
+        order_lookup = np.append(self._order, -1)
+
+        for profile_id, profile in enumerate(self.profiles):
+            sorted_scores = score_laptops(feature_levels, profile)[self._order]
+            candidates = np.full((len(FEATURE_COLUMNS) + 1, self.k), sku_count, dtype=np.int64)
+            for rank, score in enumerate(range(len(FEATURE_COLUMNS), -1, -1)):
+                first_rows = np.flatnonzero(sorted_scores == score)[:self.k]
+                candidates[rank, :len(first_rows)] = first_rows
+            candidates = candidates.ravel()
+
+            admitted = candidates[None, :] < ends
+            best = np.argsort(~admitted, axis=1, kind='stable')[:, :self.k]
+            chosen = np.where(np.take_along_axis(admitted, best, axis=1), candidates[best], sku_count)
+            self.entries[profile_id, first_breakpoint:] = order_lookup[chosen]
+
+    def lookup(self, user_levels: np.ndarray, attribute_mask: np.ndarray, budget: int):
+        """Return the precomputed top-k catalog indices for a profile and budget.
+
+        Returns:
+            np.ndarray or None: Catalog row indices, best first, or None when the profile
+                                is not a full low/medium/high profile
+        """
+        if not attribute_mask.all():
+            return None
+        profile_id = self.profile_index.get(tuple(user_levels.tolist()))
+        if profile_id is None:
+            return None
+        breakpoint = bisect.bisect_right(self.breakpoints, budget) - 1
+        if breakpoint < 0:
+            return np.empty(0, dtype=np.int32)
+        entry = self.entries[profile_id, breakpoint]
+        return entry[entry >= 0]
+
+
+class CatalogSnapshot:
+    """Immutable, compact in-memory view of the laptop inventory.
+
+    Hot columns are stored as typed NumPy arrays (int32 prices, a column-major int8
+    SKU x attribute level matrix); the remaining spec columns are pandas categoricals
+    and the long Descriptions are kept out of the frame in a separate array. All
+    arrays are read-only so the snapshot can be shared by every request.
+
+    For catalogs of up to TABLE_MAX_SKUS laptops a RecommendationTable is built as part
+    of the snapshot (incrementally, from the previous snapshot when one is given).
+    failed_classifications counts the rows whose levels are UNKNOWN_LEVEL only because
+    their classification failed.
+    """
+
+    # Larger catalogs skip the lookup table and are scored on every request
+    TABLE_MAX_SKUS = 5000
+
+    def __init__(self, laptop_df: pd.DataFrame, feature_levels: pd.DataFrame, mtime_ns: int = 0,
+                 previous=None):
+        laptop_df = laptop_df.drop(columns=[column for column in ENRICHED_COLUMNS if column in laptop_df.columns])
+        self.columns = list(laptop_df.columns)
+        self.mtime_ns = mtime_ns
+        self.failed_classifications = int(feature_levels.attrs.get(FAILED_CLASSIFICATIONS_ATTR, 0))
+        self.prices = laptop_df['Price'].astype(str).str.replace(',', '').astype(np.int32).to_numpy()
+        self.feature_levels = np.asfortranarray(feature_levels[FEATURE_COLUMNS].to_numpy(dtype=np.int8))
+        self.descriptions = laptop_df['Description'].fillna('').astype(str).to_numpy(dtype=object)
+        self.details = (laptop_df
+                        .drop(columns=['Price', 'Description'])
+                        .astype('category')
+                        .reset_index(drop=True))
+        self.recommendation_table = None
+        if len(self.prices) <= self.TABLE_MAX_SKUS:
+            previous_table = None
+            if previous is not None and previous.recommendation_table is not None:
+                previous_table = (previous.recommendation_table, previous.feature_levels, previous.prices)
+            self.recommendation_table = RecommendationTable(self.feature_levels, self.prices,
+                                                            previous=previous_table)
+        for array in (self.prices, self.feature_levels, self.descriptions):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.prices)
+
+    def recommend(self, user_requirements: dict, k: int = 3):
+        """Return the indices and scores of the top k laptops for a user profile.
+
+        Full profiles are answered from the RecommendationTable; anything else (or a
+        catalog too large for the table) is scored with score_laptops/select_top_k.
+
+        Args:
+            user_requirements (dict): Profile in the extract_user_info format
+            k (int): Number of laptops to return
+
+        Returns:
+            tuple: (np.ndarray of catalog row indices, np.ndarray of their scores)
+        """
+        budget = int(user_requirements.get('Budget', '0'))
+        user_levels, attribute_mask = encode_user_levels(user_requirements)
+
+        table = self.recommendation_table
+        if table is not None and k <= table.k:
+            top_indices = table.lookup(user_levels, attribute_mask, budget)
+            if top_indices is not None:
+                top_indices = top_indices[:k]
+                return top_indices, score_laptops(self.feature_levels[top_indices], user_levels, attribute_mask)
+
+        scores = score_laptops(self.feature_levels, user_levels, attribute_mask)
+        top_indices = select_top_k(scores, self.prices, budget, k=k)
+        return top_indices, scores[top_indices]
+
+    def to_records_json(self, indices: np.ndarray, scores: np.ndarray) -> str:
+        """Serialize the selected laptops in the original inventory column order.
+
+        Args:
+            indices (np.ndarray): Catalog row indices to serialize
+            scores (np.ndarray): Score of each selected laptop
+
+        Returns:
+            str: JSON records with every inventory column plus Score
+        """
+        selected = self.details.iloc[indices].astype(object).reset_index(drop=True)
+        selected['Price'] = self.prices[indices].astype(int)
+        selected['Description'] = self.descriptions[indices]
+        selected = selected[self.columns]
+        selected['Score'] = np.asarray(scores).astype(int)
+        return selected.to_json(orient='records')
+
+
+class LaptopCatalog:
+    """Laptop inventory loaded once and shared read-only across requests.
+
+    get() returns the current CatalogSnapshot; the inventory file is re-read only when
+    its modification time changes, and the new snapshot is built fully before it
+    replaces the old one, so concurrent requests never see a half-loaded catalog.
+
+    A snapshot with failed classifications is rebuilt by a background thread after
+    retry_seconds, doubling up to max_retry_seconds while the failures persist; requests
+    keep using the current snapshot meanwhile.
+    """
+
+    def __init__(self, path: str, classifier=classify_laptop_features, retry_seconds: float = 30.0,
+                 max_retry_seconds: float = 600.0):
+        """
+        Args:
+            path (str): Location of the inventory (CSV, or an enriched CSV/Parquet file
+                        written by BatchClassifier.py)
+            classifier (callable): Maps the inventory DataFrame to a feature level
+                                   DataFrame (see classify_laptop_features)
+            retry_seconds (float): Delay before a snapshot with failed classifications is rebuilt
+            max_retry_seconds (float): Longest delay between rebuilds
+        """
+        self.path = path
+        self.classifier = classifier
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._retry_lock = threading.Lock()  # Guards _retry_at and _retry_thread; never held long
+        self._retry_delay = retry_seconds
+        self._retry_at = 0.0
+        self._retry_thread = None
+
+    def file_version(self) -> int:
+        """Version of the inventory file (its modification time), the same in every worker."""
+        return os.stat(self.path).st_mtime_ns
+
+    def is_current(self) -> bool:
+        """Whether get() would return a loaded, fully classified snapshot without reloading."""
+        snapshot = self._snapshot
+        return (snapshot is not None and snapshot.mtime_ns == self.file_version() and
+                not snapshot.failed_classifications)
+
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, reloading it first if the file has changed."""
+        snapshot = self._snapshot
+        mtime_ns = self.file_version()
+        if snapshot is not None and snapshot.mtime_ns == mtime_ns:
+            if snapshot.failed_classifications and time.monotonic() >= self._retry_at:
+                self._start_retry()
+            return snapshot
+
+        with self._reload_lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime_ns != mtime_ns:
+                snapshot = self._load(mtime_ns, previous=snapshot)
+                self._set_snapshot(snapshot, rebuilt=False)
+            return snapshot
+
+    def _load(self, mtime_ns: int, previous=None) -> CatalogSnapshot:
+        laptop_df = read_inventory(self.path)
+        return CatalogSnapshot(laptop_df, self.classifier(laptop_df), mtime_ns, previous=previous)
+
+    def _set_snapshot(self, snapshot: CatalogSnapshot, rebuilt: bool):
+        # Called with _reload_lock held; schedules the next rebuild if classifications failed
+        self._snapshot = snapshot
+        if not snapshot.failed_classifications:
+            self._retry_delay = self.retry_seconds
+            return
+        if rebuilt:
+            self._retry_delay = min(self._retry_delay * 2, self.max_retry_seconds)
+        print(f"{snapshot.failed_classifications} laptops could not be classified; "
+              f"retrying in {self._retry_delay:.0f}s")
+        with self._retry_lock:
+            self._retry_at = time.monotonic() + self._retry_delay
+
+    def _start_retry(self):
+        # Runs on the request path, so it must not wait for a rebuild holding _reload_lock
+        with self._retry_lock:
+            if time.monotonic() < self._retry_at:
+                return
+            if self._retry_thread is not None and self._retry_thread.is_alive():
+                return
+            self._retry_at = time.monotonic() + self._retry_delay  # Not restarted while it runs
+            self._retry_thread = threading.Thread(target=self._retry_failed, name='catalog-retry', daemon=True)
+            self._retry_thread.start()
+
+    def _retry_failed(self):
+        with self._reload_lock:
+            snapshot = self._snapshot
+            try:
+                rebuilt = self._load(snapshot.mtime_ns, previous=snapshot)
+            except Exception as e:
+                print(f"Rebuilding the catalog failed: {str(e)}")
+                self._retry_delay = min(self._retry_delay * 2, self.max_retry_seconds)
+                with self._retry_lock:
+                    self._retry_at = time.monotonic() + self._retry_delay
+                return
+            # The file may have changed while it was re-read; a reload then replaces this snapshot
+            self._set_snapshot(rebuilt, rebuilt=True)
@@ -0,0 +1,314 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+# Instrumentation is on unless SHOPASSIST_METRICS=0; when off, timed() returns the
+# function itself and the record_* helpers return immediately
+METRICS_ENABLED = os.environ.get('SHOPASSIST_METRICS', '1').lower() not in ('0', 'false', 'no')
+
+# Per-request trace log: a file path, or "-" for stdout; unset disables tracing
+TRACE_LOG = os.environ.get('SHOPASSIST_TRACE_LOG')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels (values passed positionally to inc)."""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, labels), value)
+                    for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (e.g. durations in seconds)."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0, 0.0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    samples.append((f'{self.name}_bucket',
+                                    _format_labels(self.label_names, labels, [('le', repr(float(bound)))]), count))
+                samples.append((f'{self.name}_bucket', _format_labels(self.label_names, labels, [('le', '+Inf')]),
+                                series[-2]))
+                samples.append((f'{self.name}_count', _format_labels(self.label_names, labels), series[-2]))
+                samples.append((f'{self.name}_sum', _format_labels(self.label_names, labels), series[-1]))
+        return samples
+
+
+class GaugeCollector:
+    """Gauges read from a callback at scrape time; the callback returns {suffix: value}."""
+
+    metric_type = 'gauge'
+
+    def __init__(self, prefix: str, help_text: str, callback):
+        self.prefix = prefix
+        self.help_text = help_text
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [(f'{self.prefix}_{suffix}', '', value) for suffix, value in sorted(values.items())
+                if isinstance(value, (int, float))]
+
+
+class MetricsRegistry:
+    """Holds the metrics of the process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        return self.register(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def gauges(self, prefix: str, help_text: str, callback) -> GaugeCollector:
+        return self.register(GaugeCollector(prefix, help_text, callback))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            samples = metric.samples()
+            if isinstance(metric, GaugeCollector):
+                for name, labels, value in samples:
+                    lines.append(f'# HELP {name} {metric.help_text}')
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.append(f'{name}{labels} {_format_value(value)}')
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'shopassist_stage_seconds', 'Time spent in each pipeline stage', ['stage'])
+stage_errors = registry.counter(
+    'shopassist_stage_errors_total', 'Pipeline stages that raised an exception', ['stage'])
+llm_calls = registry.counter(
+    'shopassist_llm_calls_total', 'LLM calls by call site, served by the API or the response cache',
+    ['call_site', 'source'])
+llm_tokens = registry.counter(
+    'shopassist_llm_tokens_total', 'Tokens used by LLM calls', ['call_site', 'kind'])
+request_seconds = registry.histogram(
+    'shopassist_request_seconds', 'Latency of traced requests', ['endpoint'])
+turn_llm_calls = registry.histogram(
+    'shopassist_turn_llm_calls', 'LLM API calls made by one request', ['endpoint'],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+turn_tokens = registry.histogram(
+    'shopassist_turn_tokens', 'Tokens used by one request', ['endpoint'],
+    buckets=(0, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000))
+
+
+class Trace:
+    """Stages, LLM calls and token usage of one request."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = []
+        self.llm_calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages.append((stage, round(seconds * 1000, 2)))
+
+    def add_llm_call(self, cached: bool, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            if cached:
+                self.cached_calls += 1
+            else:
+                self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+_local = threading.local()
+_trace_log_lock = threading.Lock()
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def start_trace(endpoint: str):
+    """Start tracing the current request on this thread; returns the Trace (None when disabled)."""
+    if not METRICS_ENABLED:
+        return None
+    _local.trace = Trace(endpoint)
+    return _local.trace
+
+
+def finish_trace(trace, status=None):
+    """Record the per-request metrics of trace and write it to the trace log."""
+    if trace is None:
+        return
+    if getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+    seconds = time.perf_counter() - trace.started
+    request_seconds.observe(seconds, trace.endpoint)
+    turn_llm_calls.observe(trace.llm_calls, trace.endpoint)
+    turn_tokens.observe(trace.prompt_tokens + trace.completion_tokens, trace.endpoint)
+    if TRACE_LOG:
+        line = json.dumps({
+            'time': time.time(), 'endpoint': trace.endpoint, 'status': status, 'ms': round(seconds * 1000, 2),
+            'llm_calls': trace.llm_calls, 'cached_calls': trace.cached_calls,
+            'prompt_tokens': trace.prompt_tokens, 'completion_tokens': trace.completion_tokens,
+            'stages': trace.stages
+        })
+        with _trace_log_lock:
+            if TRACE_LOG == '-':
+                print(line, file=sys.stdout, flush=True)
+            else:
+                with open(TRACE_LOG, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+
+def bind_trace(func):
+    """Wrap func so that, run on another thread, it records into the caller's trace."""
+    trace = current_trace()
+    if trace is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'trace', None)
+        _local.trace = trace
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.trace = previous
+    return wrapper
+
+
+def record_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+def record_llm_call(call_site: str, usage=None, cached: bool = False):
+    """Count an LLM call and its token usage (usage: the response's usage object, if any)."""
+    if not METRICS_ENABLED:
+        return
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    llm_calls.inc(call_site, 'cache' if cached else 'api')
+    if prompt_tokens:
+        llm_tokens.inc(call_site, 'prompt', amount=prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc(call_site, 'completion', amount=completion_tokens)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_llm_call(cached, prompt_tokens, completion_tokens)
+
+
+def timed(stage: str):
+    """Decorator recording the duration of each call of a function as a pipeline stage.
+
+    Generator functions are timed from the first to the last item they produce.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return (yield from func(*args, **kwargs))
+                except Exception:
+                    stage_errors.inc(stage)
+                    raise
+                finally:
+                    record_stage(stage, time.perf_counter() - started)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                stage_errors.inc(stage)
+                raise
+            finally:
+                record_stage(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from Metrics import registry
+
+moderation_checks = registry.counter(
+    'shopassist_moderation_checks_total', 'Moderation checks by how the verdict was obtained', ['source'])
+moderation_batch_size = registry.histogram(
+    'shopassist_moderation_batch_size', 'Texts sent per moderation API call', buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class _PendingCheck:
+    __slots__ = ('key', 'text', 'done', 'flagged', 'error')
+
+    def __init__(self, key: str, text: str):
+        self.key = key
+        self.text = text
+        self.done = threading.Event()
+        self.flagged = None
+        self.error = None
+
+
+class ModerationService:
+    """Batched, cached moderation shared by all requests.
+
+    Texts checked concurrently (by any request) within batch_window seconds of each other
+    are sent to the moderation endpoint as one list input, identical pending texts are
+    sent once, and verdicts are cached by a hash of the text in an LRU of cache_size
+    entries. When the endpoint cannot be reached the policy decides: fail_open treats the
+    text as not flagged, otherwise (fail closed) as flagged. Failed checks are not cached.
+
+    There is no background thread: the first caller of a window waits for the window to
+    close and then sends the batch for everyone queued behind it.
+    """
+
+    def __init__(self, moderate_batch, batch_window: float = 0.01, max_batch: int = 32,
+                 cache_size: int = 10000, fail_open: bool = True, wait_timeout: float = 30.0):
+        """
+        Args:
+            moderate_batch (callable): Maps a list of texts to a list of flagged booleans
+            batch_window (float): Seconds to collect checks before a batch is sent
+            max_batch (int): Maximum number of texts per moderation call
+            cache_size (int): Maximum number of cached verdicts
+            fail_open (bool): Verdict policy when moderation fails (True: not flagged)
+            wait_timeout (float): Longest a caller waits for its batch before failing
+        """
+        self.moderate_batch = moderate_batch
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.fail_open = fail_open
+        self.wait_timeout = wait_timeout
+        self._cache = OrderedDict()  # text hash -> flagged
+        self._pending = OrderedDict()  # text hash -> _PendingCheck
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+    def is_flagged(self, text: str) -> bool:
+        """Return whether text is flagged, applying the failure policy if moderation fails."""
+        key = self.text_key(text)
+        with self._lock:
+            flagged = self._cache.get(key)
+            if flagged is not None:
+                self._cache.move_to_end(key)
+                moderation_checks.inc('cache')
+                return flagged
+            check = self._pending.get(key)
+            if check is None:
+                check = self._pending[key] = _PendingCheck(key, text)
+            leader = not self._flush_scheduled
+            self._flush_scheduled = True
+
+        if leader:
+            if self.batch_window > 0:
+                time.sleep(self.batch_window)
+            self._flush()
+
+        if not check.done.wait(self.wait_timeout):
+            check.error = TimeoutError("Moderation batch did not complete in time")
+        if check.error is not None:
+            moderation_checks.inc('error')
+            print(f"Moderation failed ({'fail open' if self.fail_open else 'fail closed'}): {str(check.error)}")
+            return not self.fail_open
+        moderation_checks.inc('api')
+        return check.flagged
+
+    def _flush(self):
+        with self._lock:
+            checks = list(self._pending.values())
+            self._pending.clear()
+            self._flush_scheduled = False
+
+        for start in range(0, len(checks), self.max_batch):
+            batch = checks[start:start + self.max_batch]
+            moderation_batch_size.observe(len(batch))
+            try:
+                verdicts = self.moderate_batch([check.text for check in batch])
+                if len(verdicts) != len(batch):
+                    raise ValueError(f"Moderation returned {len(verdicts)} results for {len(batch)} inputs")
+            except Exception as e:
+                for check in batch:
+                    check.error = e
+                    check.done.set()
+                continue
+
+            with self._lock:
+                for check, flagged in zip(batch, verdicts):
+                    self._cache[check.key] = bool(flagged)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for check, flagged in zip(batch, verdicts):
+                check.flagged = bool(flagged)
+                check.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'cached_verdicts': len(self._cache), 'pending': len(self._pending)}
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Content-addressed cache for deterministic LLM calls.
+
+    Entries are keyed by a hash of (model, messages, params) and hold the extracted,
+    JSON-serializable result of the call. The in-memory tier is an LRU bounded by
+    max_entries; an optional SQLite tier (disk_path) keeps results across restarts and
+    workers. Both tiers expire entries after ttl_seconds.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 24 * 3600, disk_path: str = None):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept in memory
+            ttl_seconds (float): Age after which an entry is no longer served
+            disk_path (str, optional): SQLite file for the on-disk tier
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created time, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if disk_path:
+            self._disk().execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(model: str, messages: list, params: dict) -> str:
+        """Hash a request; message contents are hashed exactly, apart from leading and
+        trailing whitespace, so prompts that differ in formatting get separate entries."""
+        normalized_messages = [
+            {**message, 'content': str(message.get('content', '')).strip()}
+            for message in messages
+        ]
+        material = json.dumps({'model': model, 'messages': normalized_messages, 'params': params},
+                              sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Return (True, value) on a hit and (False, None) on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.disk_path:
+            row = self._disk().execute(
+                "SELECT value, created FROM responses WHERE key = ? AND created >= ?",
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, row[1], value)
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, now, value)
+        if self.disk_path:
+            self._disk().execute(
+                "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now)
+            )
+
+    def get_or_compute(self, model: str, messages: list, params: dict, compute):
+        """Return the cached result of a request, calling compute() on a miss.
+
+        Exceptions raised by compute() propagate and nothing is cached.
+        """
+        key = self.make_key(model, messages, params)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            self._disk().execute("DELETE FROM responses")
+
+    def _store(self, key: str, created: float, value):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.disk_path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
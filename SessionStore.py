@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class InMemorySessionStore:
+    """Per-process session store with LRU eviction, idle expiry and a memory cap.
+
+    Session state is kept JSON-serialized, so every request works on its own copy and
+    the size of each session is known for the memory cap.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            max_sessions (int): Maximum number of sessions kept
+            ttl_seconds (float): Sessions idle for longer than this are dropped
+            max_bytes (int): Maximum total size of the serialized sessions
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()  # session_id -> (last access time, serialized state)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        """Return the state of a session, or None if it is unknown or has expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            accessed, data = entry
+            if now - accessed > self.ttl_seconds:
+                self._remove(session_id)
+                return None
+            self._sessions[session_id] = (now, data)
+            self._sessions.move_to_end(session_id)
+        return json.loads(data)
+
+    def set(self, session_id: str, state: dict):
+        """Store the state of a session and evict idle or least recently used sessions."""
+        data = json.dumps(state)
+        now = time.time()
+        with self._lock:
+            self._remove(session_id)
+            self._sessions[session_id] = (now, data)
+            self._bytes += len(data)
+            self._evict(now)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _remove(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _evict(self, now: float):
+        # Sessions are ordered by last access, so idle ones are always at the front
+        while self._sessions:
+            session_id, (accessed, _) = next(iter(self._sessions.items()))
+            over_capacity = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not over_capacity and now - accessed <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+
+
+class SQLiteSessionStore:
+    """Session store in a SQLite database shared by all worker processes on a host.
+
+    Idle sessions expire after ttl_seconds and the least recently used sessions are
+    dropped beyond max_sessions; expiry runs every few writes rather than on each one.
+    """
+
+    EVICT_EVERY_WRITES = 100
+
+    def __init__(self, path: str, max_sessions: int = 100000, ttl_seconds: float = 3600):
+        """
+        Args:
+            path (str): Location of the SQLite database file
+            max_sessions (int): Maximum number of sessions kept
+            ttl_seconds (float): Sessions idle for longer than this are dropped
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets workers read while another one writes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id: str):
+        """Return the state of a session, or None if it is unknown or has expired."""
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT data FROM sessions WHERE id = ? AND accessed >= ?",
+            (session_id, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE sessions SET accessed = ? WHERE id = ?", (now, session_id))
+        return json.loads(row[0])
+
+    def set(self, session_id: str, state: dict):
+        """Store the state of a session, periodically evicting idle and excess sessions."""
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, accessed) VALUES (?, ?, ?)",
+            (session_id, json.dumps(state), time.time())
+        )
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self.EVICT_EVERY_WRITES == 0
+        if due:
+            self.evict()
+
+    def delete(self, session_id: str):
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def evict(self):
+        """Drop idle sessions and the least recently used ones beyond max_sessions."""
+        connection = self._connection()
+        connection.execute("DELETE FROM sessions WHERE accessed < ?", (time.time() - self.ttl_seconds,))
+        connection.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            "SELECT id FROM sessions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(spec: str = None):
+    """Create the session store described by spec (defaults to $SHOPASSIST_SESSION_STORE).
+
+    Args:
+        spec (str): "memory" for the per-process store, or "sqlite:<path>" for a store
+                    shared by every worker on the host
+
+    Returns:
+        InMemorySessionStore or SQLiteSessionStore
+    """
+    spec = spec or os.environ.get('SHOPASSIST_SESSION_STORE', 'memory')
+    max_sessions = os.environ.get('SHOPASSIST_MAX_SESSIONS')
+    ttl_seconds = float(os.environ.get('SHOPASSIST_SESSION_TTL', 3600))
+    if spec == 'memory':
+        max_bytes = int(os.environ.get('SHOPASSIST_SESSION_MAX_BYTES', 256 * 1024 * 1024))
+        return InMemorySessionStore(max_sessions=int(max_sessions or 10000), ttl_seconds=ttl_seconds,
+                                    max_bytes=max_bytes)
+    if spec.startswith('sqlite:'):
+        return SQLiteSessionStore(spec[len('sqlite:'):], max_sessions=int(max_sessions or 100000),
+                                  ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown session store: {spec}")
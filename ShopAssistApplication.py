@@ -1,141 +1,377 @@
-from flask import Flask, redirect, url_for, render_template, request
+import json
+import os
+import secrets
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import Flask, Response, g, jsonify, redirect, url_for, render_template, request, stream_with_context
 from HelperFunctions import (
     initialize_conversation,
     initialize_conv_reco,
+    generate_greeting,
     get_chat_model_completions,
+    stream_chat_model_completions,
     moderation_check,
     intent_confirmation_layer,
     compare_laptops_with_user,
     recommendation_validation,
+    answer_follow_up,
     get_user_requirement_string,
-    get_chat_completions_func_calling
+    get_chat_completions_func_calling,
+    parse_user_requirement_sentence,
+    format_user_requirement_string,
+    fit_conversation_to_budget,
+    laptop_catalog
 )
-import openai
-
-openai.api_key=open("OpenAI_API_Key.txt",'r').read().strip()
+from GreetingCache import GreetingCache
+from Metrics import bind_trace, finish_trace, registry, start_trace, timed
+from SessionStore import create_session_store
 
 app = Flask(__name__)
 
-chat_conversation_history = []
-conversation = initialize_conversation()
-introduction = get_chat_model_completions(conversation)
-chat_conversation_history.append({'bot':introduction})
-top_3_laptops = None
+# Importing the app makes no API call: the greeting is served from a cache that is
+# regenerated in the background, and the catalog (and pandas) is loaded by a warm-up
+# thread; requests that need it before it is ready wait for the load to finish
+DEFAULT_GREETING = ("Hello! I'm ShopAssist, your laptop expert. "
+                    "What will you mostly use your new laptop for: gaming, work, studies or something else?")
+greeting_cache = GreetingCache(
+    generate_greeting,
+    path=os.environ.get('SHOPASSIST_GREETING_FILE', 'greeting_cache.json'),
+    refresh_seconds=float(os.environ.get('SHOPASSIST_GREETING_REFRESH', 6 * 3600)),
+    default=DEFAULT_GREETING
+)
+
+
+def warm_up_catalog():
+    try:
+        laptop_catalog.get()
+    except Exception as e:
+        print(f"Catalog warm-up failed: {str(e)}")
+
+
+# Background tasks are started once per process, so also in workers forked after import
+_background_pid = None
+_background_lock = threading.Lock()
+
+
+def start_background_tasks():
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+        greeting_cache.start()
+        threading.Thread(target=warm_up_catalog, name='catalog-warm-up', daemon=True).start()
+
+
+start_background_tasks()
+
+# Conversation state lives per visitor in a session store (in-process LRU or shared SQLite,
+# see SHOPASSIST_SESSION_STORE) keyed by a cookie, so concurrent users and workers can be served
+SESSION_COOKIE = 'shopassist_session'
+session_store = create_session_store()
+registry.gauges('shopassist_sessions', 'Session store size', lambda: {'active': len(session_store)})
+
+# Shared pool used to run the independent OpenAI calls of a turn concurrently
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('SHOPASSIST_IO_THREADS', 32)))
+
+
+# Fresh conversation state for a new or reset session
+def new_session_state(greeting):
+    return {
+        'conversation': initialize_conversation(),
+        'conversation_reco': [],
+        'chat_conversation_history': [{'bot': greeting}],
+        'top_3_laptops': None
+    }
+
+
+# Endpoints served without a conversation session
+SESSIONLESS_ENDPOINTS = {'static', 'metrics'}
+
+
+@app.before_request
+def load_session():
+    start_background_tasks()
+    if request.endpoint in SESSIONLESS_ENDPOINTS:
+        return
+    g.trace = start_trace(request.endpoint)
+    session_id = request.cookies.get(SESSION_COOKIE)
+    state = session_store.get(session_id) if session_id else None
+    g.new_session = state is None
+    if state is None:
+        session_id = secrets.token_urlsafe(32)
+        state = new_session_state(greeting_cache.get())
+    g.session_id = session_id
+    g.session_state = state
+
+
+@app.after_request
+def save_session(response):
+    if 'session_state' in g:
+        session_store.set(g.session_id, g.session_state)
+        if g.new_session:
+            response.set_cookie(SESSION_COOKIE, g.session_id, httponly=True, samesite='Lax')
+    # A streamed turn is still running here; its trace is finished when the stream ends
+    if request.endpoint != 'stream_conversation':
+        finish_trace(g.get('trace'), response.status_code)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@timed('render_template')
+def render_chat_page(chat_conversation_history):
+    return render_template("bot_page.html", name_xyz=chat_conversation_history)
 
 
 @app.route("/")
 def default_func():
-    global chat_conversation_history, conversation, top_3_laptops
-    return render_template("bot_page.html", name_xyz = chat_conversation_history)
+    return render_chat_page(g.session_state['chat_conversation_history'])
+
+# Chat history entries from position cursor on, with the cursor to send on the next turn
+def history_delta(state, cursor):
+    history = state['chat_conversation_history']
+    return {
+        'messages': [{'role': 'bot' if entry.get('bot') else 'user', 'text': entry.get('bot') or entry.get('user')}
+                     for entry in history[cursor:]],
+        'cursor': len(history)
+    }
+
+
+# Cursor sent by the client, or None when it is missing or out of range
+def request_cursor(state, payload):
+    try:
+        cursor = int(payload.get('cursor'))
+    except (TypeError, ValueError):
+        return None
+    return cursor if 0 <= cursor <= len(state['chat_conversation_history']) else None
+
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
 
 @app.route("/end_conversation", methods = ['POST','GET'])
 def end_conv():
-    global chat_conversation_history, conversation, top_3_laptops
-    chat_conversation_history = []
-    conversation = initialize_conversation()
-    introduction = get_chat_model_completions(conversation)
-    chat_conversation_history.append({'bot':introduction})
-    top_3_laptops = None
+    g.session_state = new_session_state(greeting_cache.get())
+    if wants_json():
+        return jsonify({'reset': True, **history_delta(g.session_state, 0)})
     return redirect(url_for('default_func'))
 
-@app.route("/conversation", methods=['POST'])
-def invite():
-    """Handle conversation flow for laptop recommendations.
+# Run the moderation checks and an (optional) OpenAI call of a turn concurrently.
+# Returns (flagged, result); as soon as any text is flagged the remaining work is
+# cancelled (calls already in flight finish in the background and are discarded).
+def run_with_moderation(texts, call=None, *args):
+    moderation_futures = {executor.submit(bind_trace(moderation_check), text) for text in texts}
+    call_future = executor.submit(bind_trace(call), *args) if call is not None else None
+    pending = moderation_futures | ({call_future} if call_future is not None else set())
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if any(future in moderation_futures and future.result() == 'Flagged' for future in done):
+            for future in pending:
+                future.cancel()
+            return True, None
+    return False, call_future.result() if call_future is not None else None
 
-    Returns:
-        redirect: Redirects to default route or end conversation
+
+# Streamed replies are moderated incrementally, one chunk of about this many characters at a time
+MODERATION_CHUNK_CHARS = int(os.environ.get('SHOPASSIST_MODERATION_CHUNK_CHARS', 200))
+FLAGGED_MESSAGE = ("Your message was flagged for violating our content policy. "
+                   "The conversation has been reset for your safety.")
+
+
+def generate_reply(messages, texts, stream):
+    """Generate an assistant reply while moderating texts (the user message) concurrently.
+
+    Generator of ('token', text) events, emitted only when stream is True and only once
+    the texts have passed moderation; each chunk of the reply is also moderated while
+    the rest is still being generated. Returns (flagged, reply).
     """
-    try:
-        global chat_conversation_history, conversation, top_3_laptops, conversation_reco
+    if not stream:
+        return run_with_moderation(texts, get_chat_model_completions, messages)
 
-        # Get and validate user input
-        user_input = request.form["user_input_message"]
-        prompt = ('Remember your system message and that you are an intelligent '
-                 'laptop assistant. So, you only help with questions around laptop.')
+    moderation_futures = [executor.submit(bind_trace(moderation_check), text) for text in texts]
+    input_futures = list(moderation_futures)
+    reply, held, chunk = [], [], ''
+    for token in stream_chat_model_completions(messages):
+        reply.append(token)
+        held.append(token)
+        chunk += token
+        if len(chunk) >= MODERATION_CHUNK_CHARS:
+            moderation_futures.append(executor.submit(bind_trace(moderation_check), chunk))
+            chunk = ''
+        if any(future.done() and future.result() == 'Flagged' for future in moderation_futures):
+            return True, None
+        if all(future.done() for future in input_futures):
+            for held_token in held:
+                yield 'token', held_token
+            held = []
+    if chunk:
+        moderation_futures.append(executor.submit(bind_trace(moderation_check), chunk))
 
-        if moderation_check(user_input) == 'Flagged':
-            chat_conversation_history.append({
-                'bot': "Your message was flagged for violating our content policy. The conversation has been reset for your safety."
-            })
-            return redirect(url_for('end_conv'))
+    if any(future.result() == 'Flagged' for future in moderation_futures):
+        return True, None
+    for held_token in held:
+        yield 'token', held_token
+    return False, ''.join(reply)
 
-        # Initial conversation flow
-        if top_3_laptops is None:
-            # Add user message to conversation
-            conversation.append({"role": "user", "content": user_input + prompt})
-            chat_conversation_history.append({'user': user_input})
 
-            # Get and validate assistant response
-            response_assistant = get_chat_model_completions(conversation)
-            if moderation_check(response_assistant) == 'Flagged':
-                chat_conversation_history.append({
-                    'bot': "Your message was flagged for violating our content policy. The conversation has been reset for your safety."
-                })
-                return redirect(url_for('end_conv'))
+@timed('conversation_turn')
+def conversation_turn(state, user_input, stream=False):
+    """Run one user turn against the session state.
 
-            # Check intent confirmation
-            confirmation = intent_confirmation_layer(response_assistant)
-            if moderation_check(confirmation) == 'Flagged':
-                chat_conversation_history.append({
-                    'bot': "Your message was flagged for violating our content policy. The conversation has been reset for your safety."
-                })
-                return redirect(url_for('end_conv'))
+    New bot messages are appended to state['chat_conversation_history']. This is a
+    generator of events: 'reply' (a streamed reply starts) and 'token' when stream is
+    True, and a final 'reset' (data: message to show, or None) when moderation flagged
+    the turn and the conversation has to be reset.
+    """
+    chat_conversation_history = state['chat_conversation_history']
+    conversation = state['conversation']
+    conversation_reco = state['conversation_reco']
+    prompt = ('Remember your system message and that you are an intelligent '
+             'laptop assistant. So, you only help with questions around laptop.')
 
-            if "No" in confirmation:
-                # Continue conversation if requirements are incomplete
-                conversation.append({"role": "assistant", "content": response_assistant})
-                chat_conversation_history.append({'bot': response_assistant})
+    # Initial conversation flow
+    if state['top_3_laptops'] is None:
+        # Moderate the user message while the assistant response is being generated
+        conversation.append({"role": "user", "content": user_input + prompt})
+        fit_conversation_to_budget(conversation)
+        if stream:
+            yield 'reply', None
+        flagged, response_assistant = yield from generate_reply(conversation, [user_input], stream)
+        if flagged:
+            yield 'reset', FLAGGED_MESSAGE
+            return
+        chat_conversation_history.append({'user': user_input})
+
+        # A well-formed summary sentence is parsed locally; otherwise check intent
+        # confirmation while the assistant response is being moderated
+        user_requirements = parse_user_requirement_sentence(response_assistant)
+        if user_requirements is not None:
+            if run_with_moderation([response_assistant])[0]:
+                yield 'reset', FLAGGED_MESSAGE
+                return
+            confirmation = "Yes"
+        else:
+            flagged, confirmation = run_with_moderation([response_assistant], intent_confirmation_layer,
+                                                        response_assistant)
+            if flagged:
+                yield 'reset', FLAGGED_MESSAGE
+                return
+
+        if "No" in confirmation:
+            if run_with_moderation([confirmation])[0]:
+                yield 'reset', FLAGGED_MESSAGE
+                return
+
+            # Continue conversation if requirements are incomplete
+            conversation.append({"role": "assistant", "content": response_assistant})
+            chat_conversation_history.append({'bot': response_assistant})
+        else:
+            # Process requirements and get recommendations
+            if user_requirements is not None:
+                response = format_user_requirement_string(user_requirements)
+                result = user_requirements
             else:
-                # Process requirements and get recommendations
-                response = get_user_requirement_string(response_assistant)
+                flagged, response = run_with_moderation([confirmation], get_user_requirement_string,
+                                                        response_assistant)
+                if flagged:
+                    yield 'reset', FLAGGED_MESSAGE
+                    return
                 result = get_chat_completions_func_calling(response, True)
+            chat_conversation_history.append({
+                'bot': "Thank you for providing all the information. "
+                      "Kindly wait, while I fetch the products: \n"
+            })
+
+            # Get and validate recommendations
+            state['top_3_laptops'] = compare_laptops_with_user(result)
+            validated_reco = recommendation_validation(state['top_3_laptops'])
+
+            if not validated_reco:
                 chat_conversation_history.append({
-                    'bot': "Thank you for providing all the information. "
-                          "Kindly wait, while I fetch the products: \n"
+                    'bot': "Sorry, we do not have laptops that match your requirements. "
+                          "Connecting you to a human expert. Please end this conversation."
                 })
 
-                # Get and validate recommendations
-                top_3_laptops = compare_laptops_with_user(result)
-                validated_reco = recommendation_validation(top_3_laptops)
-
-                if not validated_reco:
-                    chat_conversation_history.append({
-                        'bot': "Sorry, we do not have laptops that match your requirements. "
-                              "Connecting you to a human expert. Please end this conversation."
-                    })
-
-                # Initialize recommendation conversation
-                conversation_reco = initialize_conv_reco(validated_reco)
-                recommendation = get_chat_model_completions(conversation_reco)
-
-                if moderation_check(recommendation) == 'Flagged':
-                    chat_conversation_history.append({
-                        'bot': "Your message was flagged for violating our content policy. The conversation has been reset for your safety."
-                    })
-                    return redirect(url_for('end_conv'))
-
-                # Update conversation history
-                conversation_reco.append({
-                    "role": "user",
-                    "content": "This is my user profile" + response
-                })
-                conversation_reco.append({
-                    "role": "assistant",
-                    "content": recommendation
-                })
-                chat_conversation_history.append({'bot': recommendation})
+            # Initialize recommendation conversation
+            conversation_reco[:] = initialize_conv_reco(validated_reco, result)
+            if stream:
+                yield 'reply', None
+            flagged, recommendation = yield from generate_reply(conversation_reco, [], stream)
+            if flagged or run_with_moderation([recommendation])[0]:
+                yield 'reset', FLAGGED_MESSAGE
+                return
 
-        else:
-            # Continue recommendation conversation
+            # Update conversation history
+            conversation_reco.append({
+                "role": "user",
+                "content": "This is my user profile" + response
+            })
+            conversation_reco.append({
+                "role": "assistant",
+                "content": recommendation
+            })
+            chat_conversation_history.append({'bot': recommendation})
+
+    else:
+        # Factual follow-ups (specs, "which is lightest", feature questions) are answered
+        # from the catalog; everything else continues the recommendation conversation
+        local_answer = answer_follow_up(user_input, state['top_3_laptops'])
+        if local_answer is not None:
+            if run_with_moderation([user_input])[0]:
+                yield 'reset', FLAGGED_MESSAGE
+                return
             conversation_reco.append({"role": "user", "content": user_input})
+            conversation_reco.append({"role": "assistant", "content": local_answer})
             chat_conversation_history.append({'user': user_input})
+            chat_conversation_history.append({'bot': local_answer})
+            if stream:
+                yield 'reply', None
+                yield 'token', local_answer
+            return
 
-            response_asst_reco = get_chat_model_completions(conversation_reco)
-            if moderation_check(response_asst_reco) == 'Flagged':
-                return redirect(url_for('end_conv'))
+        # Continue recommendation conversation, moderating the user message concurrently
+        conversation_reco.append({"role": "user", "content": user_input})
+        fit_conversation_to_budget(conversation_reco)
+        if stream:
+            yield 'reply', None
+        flagged, response_asst_reco = yield from generate_reply(conversation_reco, [user_input], stream)
+        if flagged:
+            yield 'reset', FLAGGED_MESSAGE
+            return
+        chat_conversation_history.append({'user': user_input})
+
+        if run_with_moderation([response_asst_reco])[0]:
+            yield 'reset', None
+            return
+
+        conversation.append({"role": "assistant", "content": response_asst_reco})
+        chat_conversation_history.append({'bot': response_asst_reco})
+
+
+@app.route("/conversation", methods=['POST'])
+def invite():
+    """Handle conversation flow for laptop recommendations.
+
+    Returns:
+        redirect: Redirects to default route or end conversation
+    """
+    try:
+        state = g.session_state
+        user_input = request.form["user_input_message"]
 
-            conversation.append({"role": "assistant", "content": response_asst_reco})
-            chat_conversation_history.append({'bot': response_asst_reco})
+        for event, data in conversation_turn(state, user_input):
+            if event == 'reset':
+                if data:
+                    state['chat_conversation_history'].append({'bot': data})
+                return redirect(url_for('end_conv'))
 
         return redirect(url_for('default_func'))
 
@@ -143,5 +379,102 @@ def invite():
         print(f"Error in conversation handler: {str(e)}")
         return redirect(url_for('end_conv'))
 
+
+@app.route("/conversation/messages", methods=['GET', 'POST'])
+def conversation_messages():
+    """JSON API for conversation turns.
+
+    POST {"user_input_message": ..., "cursor": n} (JSON or form encoded) runs a turn and
+    returns the history entries after the client's cursor (or, without a cursor, the
+    entries added by the turn) and the new cursor. When moderation flags the turn the
+    conversation is reset and the response carries "reset": true, an optional "notice"
+    and the whole new history. GET ?cursor=n returns the entries after n without a turn.
+
+    Returns:
+        Response: {"messages": [{"role": "bot"|"user", "text": ...}], "cursor": int}
+    """
+    state = g.session_state
+    if request.method == 'GET':
+        return jsonify(history_delta(state, request_cursor(state, request.args) or 0))
+
+    payload = request.get_json(silent=True) or request.form
+    user_input = str(payload.get('user_input_message') or '').strip()
+    if not user_input:
+        return jsonify({'error': 'user_input_message is required'}), 400
+    cursor = request_cursor(state, payload)
+    history_start = len(state['chat_conversation_history'])
+
+    try:
+        for event, data in conversation_turn(state, user_input):
+            if event == 'reset':
+                g.session_state = new_session_state(greeting_cache.get())
+                return jsonify({'reset': True, 'notice': data, **history_delta(g.session_state, 0)})
+    except Exception as e:
+        print(f"Error in conversation API handler: {str(e)}")
+        g.session_state = new_session_state(greeting_cache.get())
+        return jsonify({'reset': True, 'notice': None, **history_delta(g.session_state, 0)})
+
+    return jsonify(history_delta(state, history_start if cursor is None else cursor))
+
+
+# Server-sent event carrying a JSON payload
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/conversation/stream", methods=['POST'])
+def stream_conversation():
+    """Handle a conversation turn as a server-sent event stream.
+
+    Tokens of the assistant replies are forwarded as they arrive ("reply" starts a new
+    reply, "token" carries text). The stream ends with "done" carrying the bot messages
+    added by the turn and the new history cursor (see /conversation/messages), or with
+    "reset" when moderation flagged the turn, after which the client should end the
+    conversation.
+
+    Returns:
+        Response: text/event-stream response
+    """
+    state = g.session_state
+    session_id = g.session_id
+    trace = g.get('trace')
+    user_input = request.form.get("user_input_message") or (request.get_json(silent=True) or {}).get("user_input_message", "")
+
+    saved = False
+
+    def save_state():
+        # The response headers (and after_request) went out before the turn ran. The state
+        # is saved before the final event: a client that resets the conversation as soon as
+        # it sees "reset" must not have its new session overwritten by this turn's state.
+        nonlocal saved
+        if not saved:
+            saved = True
+            session_store.set(session_id, state)
+
+    def events():
+        history_start = len(state['chat_conversation_history'])
+        try:
+            for event, data in conversation_turn(state, user_input, stream=True):
+                if event == 'reset':
+                    save_state()
+                    yield sse_event('reset', {'bot': data})
+                    return
+                yield sse_event(event, {'text': data} if event == 'token' else {})
+
+            new_messages = state['chat_conversation_history'][history_start:]
+            save_state()
+            yield sse_event('done', {'messages': [entry['bot'] for entry in new_messages if 'bot' in entry],
+                                     'cursor': len(state['chat_conversation_history'])})
+        except Exception as e:
+            print(f"Error in streaming conversation handler: {str(e)}")
+            save_state()
+            yield sse_event('reset', {'bot': None})
+        finally:
+            save_state()
+            finish_trace(trace, 200)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True, host= "0.0.0.0", port=5001)
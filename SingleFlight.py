@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from Metrics import registry
+
+singleflight_calls = registry.counter(
+    'shopassist_singleflight_calls_total', 'Calls through a single-flight group by how the result was obtained',
+    ['flight', 'source'])
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share one computation and its result.
+
+    The first caller of a key computes it; callers arriving while it runs wait for it
+    and get the same result (or exception). Nothing is kept after the computation ends,
+    so this is not a cache: a later call computes again.
+
+    With lease_path, workers on the same host coordinate through an SQLite lease: the
+    worker holding the lease of a key computes it and publishes the (JSON-serializable)
+    result, which other workers poll for and reuse for result_seconds after it was
+    published. A lease not finished within lease_seconds (e.g. its worker died) is taken
+    over. If the lease database cannot be used the result is computed locally.
+    """
+
+    def __init__(self, name: str, lease_path: str = None, lease_seconds: float = 60.0,
+                 result_seconds: float = 5.0, poll_interval: float = 0.02, wait_timeout: float = 60.0):
+        """
+        Args:
+            name (str): Name of the group in metrics
+            lease_path (str, optional): SQLite file shared by the workers
+            lease_seconds (float): Time after which an unfinished lease can be taken over
+            result_seconds (float): How long a published result is served to other workers
+            poll_interval (float): Seconds between checks for another worker's result
+            wait_timeout (float): Longest a caller waits for another thread before
+                                  computing the result itself
+        """
+        self.name = name
+        self.lease_path = lease_path
+        self.lease_seconds = lease_seconds
+        self.result_seconds = result_seconds
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if lease_path:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS flights (key TEXT PRIMARY KEY, owner TEXT NOT NULL, "
+                "expires REAL NOT NULL, result TEXT, finished REAL)"
+            )
+
+    @staticmethod
+    def make_key(value) -> str:
+        return json.dumps(value, sort_keys=True, default=str)
+
+    def do(self, key: str, compute, across_workers: bool = True):
+        """Return compute(), sharing one call among concurrent callers with the same key.
+
+        Args:
+            key (str): Identifies the computation
+            compute (callable): Computes the result
+            across_workers (bool): Also coordinate with other workers through the lease
+                                   (when lease_path is set); False skips the lease database
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                singleflight_calls.inc(self.name, 'coalesced')
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            singleflight_calls.inc(self.name, 'computed')
+            return compute()
+
+        try:
+            if self.lease_path and across_workers:
+                flight.result = self._compute_shared(key, compute)
+            else:
+                flight.result = self._compute(compute)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'in_flight': len(self._flights)}
+
+    def _compute(self, compute):
+        singleflight_calls.inc(self.name, 'computed')
+        return compute()
+
+    def _compute_shared(self, key: str, compute):
+        # Wait while another worker holds the lease; compute once it is ours
+        while True:
+            try:
+                status, result = self._acquire(key)
+            except sqlite3.Error as e:
+                print(f"Single-flight lease unavailable, computing locally: {str(e)}")
+                return self._compute(compute)
+            if status == 'result':
+                singleflight_calls.inc(self.name, 'remote')
+                return result
+            if status == 'leader':
+                break
+            time.sleep(self.poll_interval)
+
+        try:
+            result = self._compute(compute)
+        except Exception:
+            self._release(key, None, failed=True)
+            raise
+        self._release(key, result)
+        return result
+
+    def _acquire(self, key: str):
+        """Return ('result', value) if another worker published one, ('leader', None) if
+        this worker now holds the lease, or ('wait', None) while another worker does."""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT owner, expires, result, finished FROM flights WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[3] is not None and now - row[3] <= self.result_seconds:
+                return 'result', json.loads(row[2])
+            if row is not None and row[3] is None and row[1] > now and row[0] != self.owner:
+                return 'wait', None
+            connection.execute(
+                "INSERT OR REPLACE INTO flights (key, owner, expires, result, finished) VALUES (?, ?, ?, NULL, NULL)",
+                (key, self.owner, now + self.lease_seconds)
+            )
+            return 'leader', None
+        finally:
+            connection.execute("COMMIT")
+
+    def _release(self, key: str, result, failed: bool = False):
+        """Publish the result of a lease (or drop the lease of a failed computation)."""
+        now = time.time()
+        try:
+            connection = self._connection()
+            if failed:
+                connection.execute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, self.owner))
+            else:
+                connection.execute(
+                    "UPDATE flights SET result = ?, finished = ? WHERE key = ? AND owner = ?",
+                    (json.dumps(result), now, key, self.owner)
+                )
+            connection.execute(
+                "DELETE FROM flights WHERE (finished IS NOT NULL AND finished < ?) OR expires < ?",
+                (now - self.result_seconds, now - self.lease_seconds)
+            )
+        except sqlite3.Error as e:
+            print(f"Could not release the single-flight lease: {str(e)}")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; transactions are managed explicitly
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.lease_path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
@@ -0,0 +1,178 @@
+"""End-to-end conversation benchmark against a local fake OpenAI server.
+
+Each virtual user runs a scripted conversation through the Flask app (greeting, three
+requirement turns ending in the recommendation, and a follow-up question) via
+/conversation, or /conversation/messages with --api json, with its own session cookie.
+Turn latencies (p50/p95/p99), LLM calls per turn and throughput are reported for every
+concurrency level and saved as JSON.
+
+Every level starts cold and is comparable with the others: it runs its own users (other
+budgets), the LLM response and moderation caches are cleared before it, and the catalog
+is loaded before the first level so startup classification calls are not counted. The
+app runs against a temporary classification store and greeting cache, so the fake
+server's replies never reach the real ones.
+
+Usage:
+    python benchmarks/bench_conversation.py --concurrency 1,4,16 --conversations 32 --chat-latency 0.3
+    python benchmarks/bench_conversation.py --baseline benchmarks/results/conversation-<rev>-<time>.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import REPO_DIR, compare_results, summarize_latencies, write_results
+from fake_openai_server import DEFAULT_SCRIPT, FakeOpenAIServer
+
+# User messages of one conversation; {budget} varies per user so the response cache does
+# not answer every conversation after the first one
+CONVERSATION_SCRIPT = [
+    ('usage', "Hi, I mostly play games and do some video editing."),
+    ('portability', "No, it mostly stays on my desk."),
+    ('budget', "My budget is {budget} INR."),
+    ('follow_up', "Which of these is the lightest?")
+]
+
+
+def post_turn(client, api: str, message: str, cursor: int):
+    """Send one user message; returns the next cursor, raises if the turn reset the chat."""
+    if api == 'json':
+        response = client.post('/conversation/messages', json={'user_input_message': message, 'cursor': cursor})
+        delta = response.get_json(silent=True) or {}
+        if response.status_code != 200 or delta.get('reset'):
+            raise RuntimeError(f"JSON turn failed with {response.status_code}")
+        return delta['cursor']
+    response = client.post('/conversation', data={'user_input_message': message})
+    if response.status_code != 302 or response.headers.get('Location', '').endswith('/end_conversation'):
+        raise RuntimeError(f"Form turn failed with {response.status_code}")
+    return cursor
+
+
+def run_conversation(app, api: str, user_number: int, latencies: dict, lock: threading.Lock):
+    client = app.test_client()
+    started = time.perf_counter()
+    client.get('/')
+    with lock:
+        latencies['greeting'].append(time.perf_counter() - started)
+
+    budget = 60000 + (user_number * 7919) % 140000
+    cursor = 1
+    for turn, message in CONVERSATION_SCRIPT:
+        started = time.perf_counter()
+        try:
+            cursor = post_turn(client, api, message.format(budget=budget), cursor)
+        except RuntimeError as e:
+            raise RuntimeError(f"Turn {turn} of user {user_number}: {e}")
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[turn].append(elapsed)
+            latencies['all_turns'].append(elapsed)
+
+
+def use_private_caches():
+    """Point the app's on-disk caches at a temporary directory (before it is imported)."""
+    cache_dir = tempfile.mkdtemp(prefix='shopassist-bench-')
+    os.environ['SHOPASSIST_CLASSIFICATION_CACHE'] = os.path.join(cache_dir, 'classification_cache.json')
+    os.environ['SHOPASSIST_GREETING_FILE'] = os.path.join(cache_dir, 'greeting_cache.json')
+    for variable in ('SHOPASSIST_LLM_CACHE_DB', 'SHOPASSIST_SESSION_STORE', 'SHOPASSIST_SINGLEFLIGHT_LEASE'):
+        os.environ.pop(variable, None)
+    # A fresh greeting, so the app does not generate one in the background during a level
+    with open(os.environ['SHOPASSIST_GREETING_FILE'], 'w', encoding='utf-8') as f:
+        json.dump({'greeting': DEFAULT_SCRIPT['greeting'], 'generated_at': time.time()}, f)
+    return cache_dir
+
+
+def reset_caches():
+    import HelperFunctions
+    HelperFunctions.llm_response_cache.clear()
+    HelperFunctions.moderation_service.clear()
+
+
+def run_level(app, server: FakeOpenAIServer, api: str, concurrency: int, conversations: int,
+              first_user: int = 0) -> dict:
+    latencies = {name: [] for name in ['greeting', 'all_turns'] + [turn for turn, _ in CONVERSATION_SCRIPT]}
+    lock = threading.Lock()
+    reset_caches()
+    server.reset_counts()
+    started = time.perf_counter()
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_conversation, app, api, user_number, latencies, lock)
+                   for user_number in range(first_user, first_user + conversations)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors += 1
+                print(f"  {e}")
+    elapsed = time.perf_counter() - started
+
+    calls = server.counts()
+    turns = len(latencies['all_turns'])
+    return {
+        'concurrency': concurrency,
+        'conversations': conversations,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'conversations_per_second': round(conversations / elapsed, 3),
+        'turns_per_second': round(turns / elapsed, 3),
+        'llm_calls_per_turn': round(sum(calls.values()) / turns, 3) if turns else 0.0,
+        'llm_calls_by_kind': calls,
+        'latency': {name: summarize_latencies(values) for name, values in latencies.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full conversations against a fake OpenAI server.")
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated concurrency levels")
+    parser.add_argument('--api', choices=['form', 'json'], default='form',
+                        help="Send turns as form posts to /conversation or to the JSON API")
+    parser.add_argument('--conversations', type=int, default=16, help="Conversations per concurrency level")
+    parser.add_argument('--chat-latency', type=float, default=0.3, help="Seconds per fake chat completion")
+    parser.add_argument('--moderation-latency', type=float, default=0.05, help="Seconds per fake moderation call")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Extra uniform random latency (seconds)")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/conversation-<rev>-<time>.json)")
+    parser.add_argument('--baseline', help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(chat_latency=args.chat_latency, moderation_latency=args.moderation_latency,
+                              jitter=args.jitter).start()
+    os.environ['OPENAI_BASE_URL'] = server.url
+
+    # The app reads its inventory and key file relative to the repository root
+    cache_dir = use_private_caches()
+    os.chdir(REPO_DIR)
+    import openai
+    import HelperFunctions
+    HelperFunctions.set_completion_client(openai.OpenAI(api_key='benchmark', base_url=server.url, max_retries=0))
+    import ShopAssistApplication
+    HelperFunctions.laptop_catalog.get()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    results = []
+    for number, concurrency in enumerate(int(level) for level in args.concurrency.split(',')):
+        level = run_level(ShopAssistApplication.app, server, args.api, concurrency, args.conversations,
+                          first_user=number * args.conversations)
+        turns = level['latency']['all_turns']
+        print(f"concurrency {concurrency:>3}: {level['turns_per_second']:.1f} turns/s, "
+              f"p50 {turns.get('p50_ms', 0):.0f} ms, p95 {turns.get('p95_ms', 0):.0f} ms, "
+              f"p99 {turns.get('p99_ms', 0):.0f} ms, {level['llm_calls_per_turn']:.2f} LLM calls/turn, "
+              f"{level['errors']} errors")
+        results.append(level)
+    server.stop()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"Results written to {write_results('conversation', config, results, args.output)}")
+    if args.baseline:
+        compare_results(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
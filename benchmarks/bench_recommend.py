@@ -0,0 +1,118 @@
+"""Microbenchmark of compare_laptops_with_user on synthetic catalogs.
+
+Synthetic catalogs are sampled (with replacement) from the rows of laptop_inventory.csv
+with random prices, classified with the rule classifier (no LLM calls) and loaded into a
+CatalogSnapshot. For every size the snapshot build time and the latency of
+compare_laptops_with_user over random user profiles are reported and saved as JSON.
+
+Usage:
+    python benchmarks/bench_recommend.py --sizes 20,1000,10000,100000,1000000 --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import REPO_DIR, compare_results, summarize_latencies, write_results
+
+import HelperFunctions
+from LaptopCatalog import FEATURE_COLUMNS, LEVELS, CatalogSnapshot, classify_laptop_features
+
+
+class StaticCatalog:
+    """Stands in for HelperFunctions.laptop_catalog with a prebuilt snapshot."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+
+    def get(self) -> CatalogSnapshot:
+        return self.snapshot
+
+    def file_version(self) -> int:
+        return self.snapshot.mtime_ns
+
+    def is_current(self) -> bool:
+        return True
+
+
+def synthetic_inventory(inventory: pd.DataFrame, size: int, rng: np.random.Generator) -> pd.DataFrame:
+    laptop_df = inventory.iloc[rng.integers(0, len(inventory), size)].reset_index(drop=True)
+    laptop_df['Price'] = rng.integers(25000, 300000, size)
+    return laptop_df
+
+
+def random_profiles(count: int, rng: np.random.Generator) -> list:
+    profiles = []
+    for _ in range(count):
+        profile = {key: LEVELS[rng.integers(0, len(LEVELS))] for key in FEATURE_COLUMNS}
+        profile['Budget'] = str(int(rng.integers(30000, 300000)))
+        profiles.append(profile)
+    return profiles
+
+
+def run_size(inventory: pd.DataFrame, size: int, queries: int, rng: np.random.Generator) -> dict:
+    laptop_df = synthetic_inventory(inventory, size, rng)
+    started = time.perf_counter()
+    feature_levels = classify_laptop_features(laptop_df)
+    classified = time.perf_counter()
+    snapshot = CatalogSnapshot(laptop_df, feature_levels)
+    built = time.perf_counter()
+    HelperFunctions.laptop_catalog = StaticCatalog(snapshot)
+
+    recommend_seconds, compare_seconds = [], []
+    for profile in random_profiles(queries, rng):
+        started_query = time.perf_counter()
+        snapshot.recommend(profile, k=3)
+        recommend_seconds.append(time.perf_counter() - started_query)
+
+        started_query = time.perf_counter()
+        compared = HelperFunctions.compare_laptops_with_user(profile)
+        compare_seconds.append(time.perf_counter() - started_query)
+        result = json.loads(compared)
+        # Errors are returned as {"error": ...} rather than raised; timing them would be meaningless
+        if isinstance(result, dict) and 'error' in result:
+            raise RuntimeError(f"compare_laptops_with_user failed on {size} rows: {result['error']}")
+
+    return {
+        'rows': size,
+        'recommendation_table': snapshot.recommendation_table is not None,
+        'classify_ms': round((classified - started) * 1000, 3),
+        'snapshot_build_ms': round((built - classified) * 1000, 3),
+        'recommend': summarize_latencies(recommend_seconds),
+        'compare_laptops_with_user': summarize_latencies(compare_seconds)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compare_laptops_with_user on synthetic catalogs.")
+    parser.add_argument('--sizes', default='20,1000,10000,100000,1000000', help="Comma-separated catalog sizes")
+    parser.add_argument('--queries', type=int, default=200, help="User profiles timed per catalog size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/recommend-<rev>-<time>.json)")
+    parser.add_argument('--baseline', help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    inventory = pd.read_csv(os.path.join(REPO_DIR, 'laptop_inventory.csv'))
+    rng = np.random.default_rng(args.seed)
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        result = run_size(inventory, size, args.queries, rng)
+        compare = result['compare_laptops_with_user']
+        print(f"{size:>8} rows: build {result['snapshot_build_ms']:.1f} ms, "
+              f"compare_laptops_with_user p50 {compare['p50_ms']:.3f} ms, p99 {compare['p99_ms']:.3f} ms")
+        results.append(result)
+
+    print(f"Results written to {write_results('recommend', config, results, args.output)}")
+    if args.baseline:
+        compare_results(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Helpers shared by the benchmarks: latency summaries and JSON result files."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+# The benchmarks import the app modules from the repository root
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def summarize_latencies(seconds: list) -> dict:
+    """Return count, mean and p50/p95/p99/max of a list of durations, in milliseconds."""
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'count': len(values), 'mean_ms': round(float(values.mean()), 3), 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3), 'max_ms': round(float(values.max()), 3)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def write_results(name: str, config: dict, results, output: str = None) -> str:
+    """Save a benchmark run as JSON (default: benchmarks/results/<name>-<revision>-<time>.json)."""
+    revision = git_revision()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{revision}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    document = {
+        'benchmark': name,
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    return output
+
+
+def _numeric_leaves(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _numeric_leaves(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        # Runs are matched by catalog size or concurrency level rather than by position
+        for position, item in enumerate(value):
+            if isinstance(item, dict):
+                position = item.get('rows', item.get('concurrency', position))
+            yield from _numeric_leaves(item, f"{prefix}[{position}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare_results(results, baseline_path: str, threshold: float = 0.10):
+    """Print the metrics that changed by more than threshold relative to a saved run."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = dict(_numeric_leaves(baseline['results']))
+    print(f"Compared with {baseline.get('revision')} ({baseline_path}):")
+    changed = 0
+    for name, value in _numeric_leaves(results):
+        old = previous.get(name)
+        if not old or name.endswith('count'):
+            continue
+        change = (value - old) / old
+        if abs(change) > threshold:
+            changed += 1
+            print(f"  {name}: {old} -> {value} ({change:+.0%})")
+    if not changed:
+        print(f"  no metric changed by more than {threshold:.0%}")
@@ -0,0 +1,243 @@
+"""Local stand-in for the OpenAI chat completion and moderation endpoints.
+
+Replies are scripted from the prompts ShopAssist sends (greeting, requirement questions,
+summary sentence, intent confirmation, function calling, classification, recommendation
+and follow-up answers), so full conversations run without network access. Every request
+waits for a configurable latency (plus jitter) before it is answered, and streamed replies
+are sent one word at a time.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8089 --chat-latency 0.4
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python ShopAssistApplication.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FEATURE_COLUMNS = ['GPU intensity', 'Display quality', 'Portability', 'Multitasking', 'Processing speed']
+
+# Replies of the main conversation, by number of user messages so far; the last entry
+# (the summary sentence) is repeated for any later message. {budget} is the last number
+# of five or more digits the user wrote.
+DEFAULT_SCRIPT = {
+    'greeting': "Hello! I'm ShopAssist. What will you mostly use your new laptop for?",
+    'chat': [
+        "Great, gaming needs a strong GPU and processor. Do you carry your laptop around often?",
+        "Got it. What is your budget?",
+        "Thank you. Here's a summary of your needs:\nI need a laptop with high GPU intensity, "
+        "medium Display quality, low Portability, high Multitasking, high Processing speed "
+        "and a budget of {budget}."
+    ],
+    'recommendation': "1. {first} : the best match for your profile, Rs {price}\n"
+                      "2. A close alternative with a little less performance.\n"
+                      "3. The most affordable option that still fits your needs.",
+    'follow_up': "The first laptop is the lightest of the three and has the longest battery life.",
+    'summary': "The user wants a gaming laptop and has given a budget.",
+    'classification': "Laptop with medium GPU intensity, medium display quality, medium portability, "
+                      "medium multitasking, medium processing speed"
+}
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server answering /v1/chat/completions and /v1/moderations.
+
+    Latencies are in seconds; each request sleeps latency + uniform(0, jitter) first.
+    request_counts counts the requests served per kind (chat, function_calling,
+    intent_confirmation, requirement_string, classification, recommendation, summary,
+    moderation).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, chat_latency: float = 0.3,
+                 moderation_latency: float = 0.05, jitter: float = 0.05, token_delay: float = 0.0,
+                 script: dict = None):
+        self.chat_latency = chat_latency
+        self.moderation_latency = moderation_latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.script = {**DEFAULT_SCRIPT, **(script or {})}
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self.request_counts)
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def _sleep(self, latency: float):
+        delay = latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reply_for(self, request: dict):
+        """Return (kind, content, function_call arguments) for a chat completion request."""
+        messages = request.get('messages', [])
+        system = str(messages[0].get('content', '')) if messages else ''
+        last = str(messages[-1].get('content', '')) if messages else ''
+
+        if request.get('functions'):
+            text = last.lower()
+            levels = re.findall(r'\b(low|medium|high)\b', text)
+            levels = (levels + ['medium'] * len(FEATURE_COLUMNS))[:len(FEATURE_COLUMNS)]
+            budget = re.findall(r'budget of (\d+)', text)
+            arguments = dict(zip(FEATURE_COLUMNS, levels), Budget=int(budget[0]) if budget else 0)
+            return 'function_calling', None, json.dumps(arguments)
+        if 'Verify if the input contains valid values' in system:
+            return 'intent_confirmation', 'Yes' if 'I need a laptop with' in last else 'No', None
+        if 'extracts structured user intent' in system:
+            return 'requirement_string', last.replace('Input: ', '', 1), None
+        if 'running summary' in system:
+            return 'summary', self.script['summary'], None
+        if 'laptop gadget expert' in system:
+            if len(messages) == 1:
+                match = re.search(r'1\. ([^|\n]+?) \| price=(\d+)', system)
+                first, price = (match.group(1).strip(), match.group(2)) if match else ('The top pick', '0')
+                return 'recommendation', self.script['recommendation'].format(first=first, price=price), None
+            return 'follow_up', self.script['follow_up'], None
+        if 'Classify laptop features' in system:
+            return 'classification', self.script['classification'], None
+
+        user_messages = [str(message.get('content', '')) for message in messages if message.get('role') == 'user']
+        if not user_messages:
+            return 'chat', self.script['greeting'], None
+        budgets = re.findall(r'\d{5,}', ' '.join(user_messages).replace(',', ''))
+        reply = self.script['chat'][min(len(user_messages), len(self.script['chat'])) - 1]
+        return 'chat', reply.format(budget=budgets[-1] if budgets else 150000), None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.endswith('/moderations'):
+                    server._count('moderation')
+                    server._sleep(server.moderation_latency)
+                    inputs = request.get('input')
+                    inputs = inputs if isinstance(inputs, list) else [inputs]
+                    self._send_json({
+                        'id': 'modr-fake', 'model': 'omni-moderation-latest',
+                        'results': [{'flagged': False, 'categories': {}, 'category_scores': {}} for _ in inputs]
+                    })
+                elif self.path.endswith('/chat/completions'):
+                    kind, content, arguments = server.reply_for(request)
+                    server._count(kind)
+                    server._sleep(server.chat_latency)
+                    if request.get('stream'):
+                        self._stream(request, content)
+                    else:
+                        self._complete(request, content, arguments)
+                else:
+                    self._send_json({'error': {'message': f'Unknown path {self.path}'}}, status=404)
+
+            def _usage(self, request: dict, content: str) -> dict:
+                prompt_tokens = sum(len(str(message.get('content', ''))) for message in request.get('messages', [])) // 4
+                completion_tokens = len(content or '') // 4 + 1
+                return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens}
+
+            def _complete(self, request: dict, content: str, arguments: str):
+                message = {'role': 'assistant', 'content': content}
+                if arguments is not None:
+                    message['function_call'] = {'name': 'extract_user_info', 'arguments': arguments}
+                self._send_json({
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': request.get('model', 'gpt-3.5-turbo'),
+                    'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+                    'usage': self._usage(request, content or arguments)
+                })
+
+            def _stream(self, request: dict, content: str):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                def chunk(delta=None, usage=None):
+                    payload = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                               'model': request.get('model', 'gpt-3.5-turbo'),
+                               'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+                    if usage is not None:
+                        payload['usage'] = usage
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+                words = (content or '').split(' ')
+                for position, word in enumerate(words):
+                    chunk({'content': word + (' ' if position < len(words) - 1 else '')})
+                    if server.token_delay:
+                        time.sleep(server.token_delay)
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    chunk(usage=self._usage(request, content))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI server for offline benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--chat-latency', type=float, default=0.3, help="Seconds per chat completion")
+    parser.add_argument('--moderation-latency', type=float, default=0.05, help="Seconds per moderation call")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Extra uniform random latency (seconds)")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument('--script', help="JSON file overriding entries of DEFAULT_SCRIPT")
+    args = parser.parse_args()
+
+    script = json.load(open(args.script, 'r', encoding='utf-8')) if args.script else None
+    server = FakeOpenAIServer(args.host, args.port, args.chat_latency, args.moderation_latency, args.jitter,
+                              args.token_delay, script)
+    print(f"Fake OpenAI server listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
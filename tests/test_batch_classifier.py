@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import BatchClassifier
+import HelperFunctions
+from LaptopCatalog import CLASSIFIER_VERSION_COLUMN, FEATURE_COLUMNS, LEVELS
+from ResponseCache import ResponseCache
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def stubbed(tmp_path, monkeypatch):
+    """Stub client, private response cache and a classification store under tmp_path."""
+    stub = BatchClassifier.StubCompletionClient()
+    HelperFunctions.set_completion_client(stub)
+    monkeypatch.setattr(HelperFunctions, 'llm_response_cache', ResponseCache())
+    live_store = HelperFunctions.CLASSIFICATION_CACHE_FILE
+    HelperFunctions.use_classification_cache(str(tmp_path / 'classification_cache.json'))
+    yield stub
+    HelperFunctions.use_classification_cache(live_store)
+    HelperFunctions.set_completion_client(None)
+
+
+def test_classify_inventory_with_stub(tmp_path, stubbed):
+    input_path = tmp_path / 'laptop_inventory.csv'
+    shutil.copy(os.path.join(REPO_DIR, 'laptop_inventory.csv'), input_path)
+    output_path = tmp_path / 'enriched.csv'
+    version = BatchClassifier.STUB_VERSION_PREFIX + HelperFunctions.get_classifier_prompt_version()
+
+    stats = BatchClassifier.classify_inventory(str(input_path), str(output_path), workers=2, rate=1000,
+                                               classifier_version=version)
+
+    assert stats['failed'] == 0
+    assert stats['classified'] == stats['unique_descriptions']
+    # Identical product maps share one (response-cached) function calling request
+    assert stats['classified'] < stubbed.calls <= BatchClassifier.CALLS_PER_LAPTOP * stats['classified']
+    enriched = pd.read_csv(output_path)
+    assert len(enriched) == stats['rows']
+    assert set(enriched[CLASSIFIER_VERSION_COLUMN]) == {version}
+    for key in FEATURE_COLUMNS:
+        assert enriched[key].isin(LEVELS).all()
+    with open(tmp_path / 'classification_cache.json', encoding='utf-8') as f:
+        assert len(json.load(f)) == stats['classified']
+
+    # A second run resumes everything from the checkpoint without calling the client
+    calls = stubbed.calls
+    stats = BatchClassifier.classify_inventory(str(input_path), str(output_path), classifier_version=version)
+    assert stats['resumed'] == stats['unique_descriptions']
+    assert stubbed.calls == calls
+
+
+def test_stub_results_are_ignored_by_the_app(tmp_path, stubbed):
+    input_path = tmp_path / 'laptop_inventory.csv'
+    shutil.copy(os.path.join(REPO_DIR, 'laptop_inventory.csv'), input_path)
+    output_path = tmp_path / 'enriched.csv'
+    BatchClassifier.classify_inventory(
+        str(input_path), str(output_path),
+        classifier_version=BatchClassifier.STUB_VERSION_PREFIX + HelperFunctions.get_classifier_prompt_version())
+
+    # The app only trusts enriched levels written for the current prompt version
+    enriched = pd.read_csv(output_path)
+    assert not (enriched[CLASSIFIER_VERSION_COLUMN] == HelperFunctions.get_classifier_prompt_version()).any()
+    # Checkpoint records of a stubbed run are not resumed by a real one
+    checkpoint = f"{output_path}.checkpoint.jsonl"
+    assert BatchClassifier.load_checkpoint(checkpoint, HelperFunctions.get_classifier_prompt_version()) == {}
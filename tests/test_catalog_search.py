@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from CatalogSearch import CatalogSearch, route_follow_up
+
+# Recommended laptops as the app passes them (Price as int); listed by decreasing price:
+# first Razer, second MSI, third Dell
+PRODUCTS = [
+    {'Brand': 'Dell', 'Model Name': 'Inspiron', 'Price': 35000, 'Laptop Weight': '2.5 kg',
+     'Average Battery Life': '6 hours', 'RAM Size': '8GB', 'Display Size': '15.6"', 'Clock Speed': '2.4 GHz',
+     'Warranty': '1 year', 'Core': 'i5', 'CPU Manufacturer': 'Intel', 'Graphics Processor': 'Intel UHD',
+     'Storage Type': 'SSD', 'Display Type': 'LCD', 'OS': 'Windows 10', 'Special Features': 'Backlit Keyboard',
+     'Description': 'A budget laptop for everyday work.'},
+    {'Brand': 'MSI', 'Model Name': 'GL65', 'Price': 55000, 'Laptop Weight': '2.3 kg',
+     'Average Battery Life': '4 hours', 'RAM Size': '16GB', 'Display Size': '15.6"', 'Clock Speed': '2.6 GHz',
+     'Warranty': '2 years', 'Core': 'i7', 'CPU Manufacturer': 'Intel', 'Graphics Processor': 'NVIDIA GTX',
+     'Storage Type': 'SSD', 'Display Type': 'IPS', 'OS': 'Windows 10', 'Special Features': 'RGB Keyboard',
+     'Description': 'A gaming laptop with a fast display.'},
+    {'Brand': 'Razer', 'Model Name': 'Blade 15', 'Price': 150000, 'Laptop Weight': '2.09 kg',
+     'Average Battery Life': '5 hours', 'RAM Size': '16GB', 'Display Size': '15.6"', 'Clock Speed': '2.6 GHz',
+     'Warranty': '1 year', 'Core': 'i7', 'CPU Manufacturer': 'Intel', 'Graphics Processor': 'NVIDIA RTX',
+     'Storage Type': 'SSD', 'Display Type': 'OLED', 'OS': 'Windows 10', 'Special Features': 'Thunderbolt 3',
+     'Description': 'A premium gaming laptop with a thin aluminium body.'}
+]
+
+
+@pytest.mark.parametrize('question, expected', [
+    ("Which of these is the lightest?", "the lightest is the Razer Blade 15 (2.09 kg)"),
+    ("which one has the longest battery life", "the longest battery life is the Dell Inspiron (6 hours)"),
+    ("What is the price of the second one?", "The MSI GL65 has a price of Rs 55,000."),
+    ("How much does the Inspiron weigh?", "The Dell Inspiron has a weight of 2.5 kg."),
+    ("which one is most affordable", "the cheapest is the Dell Inspiron (Rs 35,000)"),
+    ("Which is cheaper, the first or the third?", "the cheapest is the Dell Inspiron (Rs 35,000)"),
+    ("Which has more RAM, the first or the second?", "both have the same RAM: 16GB"),
+    ("What is the largest screen?", "all 3 have the same screen size: 15.6\""),
+    ("which has the most ram", "the Razer Blade 15 and MSI GL65 tie for the most RAM (16GB)"),
+    ("compare the RAM of all three", "RAM: Razer Blade 15 16GB, MSI GL65 16GB, Dell Inspiron 8GB."),
+    ("what graphics does the first one have", "The Razer Blade 15 has graphics: NVIDIA RTX."),
+    ("which ones have a backlit keyboard?", "the Dell Inspiron has backlit keyboard"),
+    ("Does the third one have a backlit keyboard?", "Yes, the Dell Inspiron has backlit keyboard."),
+])
+def test_answered_locally(question, expected):
+    assert expected in route_follow_up(question, PRODUCTS)
+
+
+@pytest.mark.parametrize('question', [
+    # Open-ended or judgement questions
+    "Which is the best for my needs?",
+    "Which has the best display?",
+    "Can you tell me more about gaming?",
+    "thanks!",
+    # Asks for other laptops, not a comparison of these
+    "Is there a cheaper option?",
+    # The superlative picks the laptop, not the attribute asked about
+    "How long does the battery last on the cheapest one?",
+    "How much RAM does the most expensive one have?",
+    # A comparison naming a single laptop
+    "Which is cheapest, the second one?",
+    # Absence of a keyword is not evidence the feature is missing
+    "Does the first one have a backlit keyboard?",
+    "Which ones have a fingerprint reader?",
+    # A superlative with a further condition or a second ranked attribute
+    "what is the lightest laptop in your store with an rtx gpu?",
+    "which is the cheapest laptop with a backlit keyboard in your catalog?",
+    "which laptop in your catalog has the longest battery life under 60000?",
+    "what is the lightest macbook you have?",
+    "which has the most ram and is under 1.5 kg?",
+    "which one has the lowest weight and the best battery?",
+])
+def test_escalated_to_llm(question):
+    catalog = CatalogSearch(pd.DataFrame(PRODUCTS))
+    assert route_follow_up(question, PRODUCTS, lambda: catalog) is None
+
+
+def test_catalog_scope_uses_the_catalog_index():
+    catalog = CatalogSearch(pd.DataFrame(PRODUCTS))
+    answer = route_follow_up("Which laptops in your catalog have thunderbolt?", PRODUCTS[:1], lambda: catalog)
+    assert answer == "In our catalog, the Razer Blade 15 has thunderbolt."
+    assert route_follow_up("What is the cheapest laptop in your catalog?", PRODUCTS[:1], lambda: catalog) == \
+        "In our catalog, the cheapest is the Dell Inspiron (Rs 35,000)."
+
+
+def test_bm25_requires_every_term():
+    catalog = CatalogSearch(pd.DataFrame(PRODUCTS))
+    assert [doc for doc, _ in catalog.bm25.search(['gaming', 'laptop'])] == [1, 2]
+    assert [doc for doc, _ in catalog.bm25.search(['gaming', 'aluminium'])] == [2]
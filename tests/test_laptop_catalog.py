@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from LaptopCatalog import (FEATURE_COLUMNS, LEVELS, RecommendationTable, encode_user_levels, score_laptops,
+                           select_top_k)
+
+
+def random_catalog(seed, sku_count=60):
+    """Random level matrix and prices with repeated prices, so ties are exercised."""
+    rng = np.random.default_rng(seed)
+    feature_levels = np.asfortranarray(
+        rng.integers(0, len(LEVELS), size=(sku_count, len(FEATURE_COLUMNS))).astype(np.int8))
+    prices = (rng.integers(20, 60, size=sku_count) * 1000).astype(np.int32)
+    return feature_levels, prices
+
+
+def budgets_for(prices):
+    # Every breakpoint, a budget between breakpoints, and budgets below and above the catalog
+    breakpoints = np.unique(prices).tolist()
+    return breakpoints + [price + 500 for price in breakpoints] + [min(breakpoints) - 1, max(breakpoints) * 2]
+
+
+def assert_matches_select_top_k(table, feature_levels, prices):
+    for profile in table.profiles:
+        scores = score_laptops(feature_levels, profile)
+        mask = np.ones(len(FEATURE_COLUMNS), dtype=bool)
+        for budget in budgets_for(prices):
+            expected = select_top_k(scores, prices, budget, k=table.k)
+            np.testing.assert_array_equal(table.lookup(profile, mask, budget), expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_table_matches_select_top_k(seed):
+    feature_levels, prices = random_catalog(seed)
+    table = RecommendationTable(feature_levels, prices, k=3)
+    assert table.rebuilt_breakpoints == len(table.breakpoints)
+    assert_matches_select_top_k(table, feature_levels, prices)
+
+
+def test_incremental_rebuild_matches_a_full_build():
+    feature_levels, prices = random_catalog(2)
+    old_table = RecommendationTable(feature_levels, prices, k=3)
+
+    # Change the levels of one expensive SKU and the price of another
+    new_levels = feature_levels.copy(order='F')
+    new_prices = prices.copy()
+    expensive = np.argsort(prices, kind='stable')[-5:]
+    new_levels[expensive[0]] = (new_levels[expensive[0]] + 1) % len(LEVELS)
+    new_prices[expensive[1]] += 3000
+
+    table = RecommendationTable(new_levels, new_prices, k=3, previous=(old_table, feature_levels, prices))
+    assert 0 < table.rebuilt_breakpoints < len(table.breakpoints)
+    np.testing.assert_array_equal(table.entries, RecommendationTable(new_levels, new_prices, k=3).entries)
+    assert_matches_select_top_k(table, new_levels, new_prices)
+
+
+def test_unchanged_catalog_reuses_every_entry():
+    feature_levels, prices = random_catalog(3)
+    old_table = RecommendationTable(feature_levels, prices, k=3)
+    table = RecommendationTable(feature_levels, prices, k=3, previous=(old_table, feature_levels, prices))
+    assert table.rebuilt_breakpoints == 0
+    np.testing.assert_array_equal(table.entries, old_table.entries)
+
+
+def test_partial_profiles_are_not_in_the_table():
+    feature_levels, prices = random_catalog(4)
+    table = RecommendationTable(feature_levels, prices, k=3)
+    user_levels, attribute_mask = encode_user_levels({key: 'high' for key in FEATURE_COLUMNS[1:]})
+    assert not attribute_mask[0]
+    assert table.lookup(user_levels, attribute_mask, int(prices.max())) is None
@@ -0,0 +1,43 @@
+import pytest
+
+from HelperFunctions import format_user_requirement_string, parse_user_requirement_sentence
+
+PROFILE = {'GPU intensity': 'high', 'Display quality': 'medium', 'Portability': 'low',
+           'Multitasking': 'high', 'Processing speed': 'medium', 'Budget': 150000}
+ATTRIBUTES = ("high GPU intensity, medium display quality, low portability, high multitasking, "
+              "medium processing speed")
+
+
+@pytest.mark.parametrize('message', [
+    format_user_requirement_string(PROFILE),
+    f"Great! I need a laptop with {ATTRIBUTES} and a budget of 150000. Let me find options.",
+    f"I need a laptop with {ATTRIBUTES}, and a budget of 150,000",
+    f"I need a laptop with {ATTRIBUTES} and a budget of Rs. 150000.",
+    f"I need a laptop with {ATTRIBUTES} and a budget of 150000 INR for work",
+    f"I need a laptop with {ATTRIBUTES} and a budget of 150000 rupees, thanks",
+    f"I need a laptop with {ATTRIBUTES} and a budget of 150000\nShall I proceed?",
+    f'"I need a laptop with {ATTRIBUTES} and a budget of 150000"',
+])
+def test_summary_sentence_is_parsed(message):
+    assert parse_user_requirement_sentence(message) == PROFILE
+
+
+def test_attributes_in_any_order():
+    message = ("I need a laptop with medium processing speed, high multitasking, low portability, "
+               "medium display quality, high GPU intensity and a budget of 150000.")
+    assert parse_user_requirement_sentence(message) == PROFILE
+
+
+@pytest.mark.parametrize('message', [
+    f"I need a laptop with {ATTRIBUTES} and a budget of 150000 USD.",
+    f"I need a laptop with {ATTRIBUTES} and a budget of 1500.50.",
+    f"I need a laptop with {ATTRIBUTES} and a budget of 150000 or so.",
+    f"I need a laptop with {ATTRIBUTES} and a budget of around 150000.",
+    "I need a laptop with high GPU intensity, medium display quality and a budget of 150000.",
+    f"I need a laptop with {ATTRIBUTES}, high GPU intensity and a budget of 150000.",
+    f"I need a laptop with {ATTRIBUTES.replace('high GPU', 'extreme GPU')} and a budget of 150000.",
+    "What budget do you have in mind?",
+    None,
+])
+def test_anything_else_falls_back_to_the_llm(message):
+    assert parse_user_requirement_sentence(message) is None
@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+import SessionStore
+from SessionStore import InMemorySessionStore, SQLiteSessionStore, create_session_store
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(SessionStore, 'time', clock)
+    return clock
+
+
+def test_memory_store_returns_copies():
+    store = InMemorySessionStore()
+    store.set('a', {'conversation': ['hi']})
+    state = store.get('a')
+    state['conversation'].append('changed')
+    assert store.get('a') == {'conversation': ['hi']}
+    assert store.get('unknown') is None
+
+
+def test_memory_store_evicts_least_recently_used(clock):
+    store = InMemorySessionStore(max_sessions=2)
+    store.set('a', {'n': 1})
+    clock.now += 1
+    store.set('b', {'n': 2})
+    clock.now += 1
+    store.get('a')  # 'b' is now the least recently used
+    clock.now += 1
+    store.set('c', {'n': 3})
+    assert store.get('b') is None
+    assert store.get('a') == {'n': 1}
+    assert store.get('c') == {'n': 3}
+    assert len(store) == 2
+
+
+def test_memory_store_expires_idle_sessions(clock):
+    store = InMemorySessionStore(ttl_seconds=60)
+    store.set('a', {'n': 1})
+    store.set('b', {'n': 2})
+    clock.now += 30
+    assert store.get('a') == {'n': 1}  # Access renews the session
+    clock.now += 45
+    assert store.get('a') == {'n': 1}
+    assert store.get('b') is None
+    assert len(store) == 1
+
+
+def test_memory_store_respects_the_memory_cap():
+    store = InMemorySessionStore(max_bytes=100)
+    store.set('a', {'text': 'x' * 40})
+    store.set('b', {'text': 'y' * 40})
+    assert store.get('a') is None
+    assert store.get('b') == {'text': 'y' * 40}
+    # Replacing a session releases the size of its old state
+    store.set('b', {'text': 'z' * 40})
+    assert len(store) == 1 and store._bytes < 100
+
+
+def test_sqlite_store_round_trip_and_ttl(tmp_path, clock):
+    path = str(tmp_path / 'sessions.db')
+    store = SQLiteSessionStore(path, ttl_seconds=60)
+    store.set('a', {'conversation': ['hi']})
+    # A second store (another worker) on the same file sees the session
+    assert SQLiteSessionStore(path, ttl_seconds=60).get('a') == {'conversation': ['hi']}
+    clock.now += 61
+    assert store.get('a') is None
+    store.evict()
+    assert len(store) == 0
+
+
+def test_sqlite_store_evicts_least_recently_used(tmp_path, clock):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions=2)
+    for session_id in 'abc':
+        clock.now += 1
+        store.set(session_id, {'id': session_id})
+    clock.now += 1
+    store.get('a')
+    store.evict()
+    assert store.get('b') is None
+    assert store.get('a') == {'id': 'a'} and store.get('c') == {'id': 'c'}
+    store.delete('a')
+    assert len(store) == 1
+
+
+def test_sqlite_store_counts_concurrent_writes(tmp_path, monkeypatch):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    evictions = []
+    monkeypatch.setattr(store, 'evict', lambda: evictions.append(1))
+
+    def write(thread_id):
+        for n in range(50):
+            store.set(f'{thread_id}-{n}', {'n': n})
+
+    threads = [threading.Thread(target=write, args=(thread_id,)) for thread_id in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store._writes == 200
+    assert len(evictions) == 200 // SQLiteSessionStore.EVICT_EVERY_WRITES
+
+
+def test_create_session_store(tmp_path):
+    assert isinstance(create_session_store('memory'), InMemorySessionStore)
+    assert isinstance(create_session_store(f"sqlite:{tmp_path / 'sessions.db'}"), SQLiteSessionStore)
+    with pytest.raises(ValueError):
+        create_session_store('redis://localhost')
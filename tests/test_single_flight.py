@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from HelperFunctions import recommendation_flight_key
+from SingleFlight import SingleFlight
+
+
+def run_concurrently(flight, key, compute, callers):
+    """Start the first caller, let it begin computing, then the others; return all results."""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, compute))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'laptops': [1, 2, 3]}
+
+    threads, results, errors = run_concurrently(flight, 'key', compute, 5)
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    assert flight.stats() == {'in_flight': 1}
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and not errors
+    assert results == [{'laptops': [1, 2, 3]}] * 5
+    assert flight.stats() == {'in_flight': 0}
+    # Not a cache: the next call computes again
+    flight.do('key', compute)
+    assert len(calls) == 2
+
+
+def test_waiters_get_the_error_of_the_computation():
+    flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError('catalog unavailable')
+
+    threads, results, errors = run_concurrently(flight, 'key', compute, 3)
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert not results
+    assert len(errors) == 3 and all(isinstance(error, ValueError) for error in errors)
+
+
+def test_different_keys_are_not_shared():
+    flight = SingleFlight('test')
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+
+
+@pytest.fixture
+def lease_path(tmp_path):
+    return str(tmp_path / 'flights.db')
+
+
+def test_worker_reuses_the_result_published_by_another(lease_path):
+    worker_a = SingleFlight('test', lease_path=lease_path)
+    worker_b = SingleFlight('test', lease_path=lease_path)
+    assert worker_a.do('key', lambda: [1, 2]) == [1, 2]
+
+    def not_called():
+        raise AssertionError('the published result should be used')
+
+    assert worker_b.do('key', not_called) == [1, 2]
+
+
+def test_worker_waits_for_the_lease_holder(lease_path):
+    worker_a = SingleFlight('test', lease_path=lease_path)
+    worker_b = SingleFlight('test', lease_path=lease_path)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'from a'
+
+    thread = threading.Thread(target=worker_a.do, args=('key', slow))
+    thread.start()
+    assert started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    assert worker_b.do('key', lambda: 'from b') == 'from a'
+    thread.join()
+
+
+def test_expired_lease_is_taken_over(lease_path):
+    # Worker A takes the lease and dies before publishing a result
+    worker_a = SingleFlight('test', lease_path=lease_path, lease_seconds=0.2)
+    assert worker_a._acquire('key') == ('leader', None)
+    worker_b = SingleFlight('test', lease_path=lease_path)
+
+    started = time.monotonic()
+    assert worker_b.do('key', lambda: 'from b') == 'from b'
+    assert 0.15 <= time.monotonic() - started < 5
+
+
+def test_local_flights_skip_the_lease(lease_path):
+    worker_a = SingleFlight('test', lease_path=lease_path, lease_seconds=60)
+    assert worker_a._acquire('key') == ('leader', None)
+    worker_b = SingleFlight('test', lease_path=lease_path)
+
+    started = time.monotonic()
+    assert worker_b.do('key', lambda: 'local', across_workers=False) == 'local'
+    assert time.monotonic() - started < 1
+    # The local result is not published for other workers
+    assert worker_b._acquire('key') == ('wait', None)
+
+
+def test_unusable_lease_database_computes_locally(tmp_path):
+    flight = SingleFlight('test', lease_path=str(tmp_path / 'flights.db'))
+    flight.lease_path = str(tmp_path / 'missing' / 'flights.db')
+    flight._local = threading.local()
+    assert flight.do('key', lambda: 'local') == 'local'
+
+
+def test_recommendation_key_follows_the_catalog_encoding():
+    profile = {'GPU intensity': 'high', 'Display quality': 'medium', 'Portability': 'low',
+               'Multitasking': 'high', 'Processing speed': 'medium', 'Budget': '80000'}
+    missing = {key: value for key, value in profile.items() if key != 'Portability'}
+    invalid = dict(profile, Portability='ultra')
+    keys = {recommendation_flight_key(requirements, 1) for requirements in (profile, missing, invalid)}
+    assert len(keys) == 3
+    assert recommendation_flight_key(dict(profile, Portability='LOW', Budget=80000), 1) == \
+        recommendation_flight_key(profile, 1)
+    assert recommendation_flight_key(profile, 2) != recommendation_flight_key(profile, 1)